@@ -1,7 +1,31 @@
 pytest_plugins = ("pytest_asyncio.plugin",)
 
+import os
+
 import pytest
 
+# Test databases are throwaway copies; skip SQLite's durability fsyncs.
+os.environ.setdefault("VAULTPILOT_SQLITE_SYNCHRONOUS", "OFF")
+
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+
+async def _stub_batch_transfer_context(self, address, txn):
+    return (
+        await self.get_nonce(address),
+        await self.max_priority_fee(),
+        await self.get_block_latest(),
+        await self.estimate_gas(txn),
+        await self.get_balance(address),
+    )
+
+
+@pytest.fixture(scope="session")
+def stub_batch_transfer_context():
+    """``Web3Adapter.batch_transfer_context`` for web3 stubs, built from their single calls.
+
+    Bind it as a method on the stub class.
+    """
+    return _stub_batch_transfer_context
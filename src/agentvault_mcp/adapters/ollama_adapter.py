@@ -1,5 +1,6 @@
+import json
 import os
-from typing import Optional
+from typing import Awaitable, Callable, List, Optional
 
 import httpx
 
@@ -16,22 +17,38 @@ class OllamaAdapter:
         self.host = (host or os.getenv("OLLAMA_HOST") or "http://127.0.0.1:11434").rstrip("/")
         self.model = model or os.getenv("OLLAMA_MODEL", "llama3.1:8b")
 
-    async def call(self, context: ContextSchema) -> str:
+    async def call(
+        self,
+        context: ContextSchema,
+        *,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> str:
+        """Return the reply for ``context``; with ``on_delta`` it is streamed."""
         msgs = []
         if context.system_prompt:
             msgs.append({"role": "system", "content": context.system_prompt})
         msgs.extend(context.history)
+        payload = {"model": self.model, "messages": msgs, "stream": on_delta is not None}
         try:
             async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.post(
-                    f"{self.host}/api/chat",
-                    json={"model": self.model, "messages": msgs, "stream": False},
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                # Ollama returns {message: {role, content}}
-                msg = data.get("message", {}).get("content")
-                return msg or ""
+                if on_delta is None:
+                    resp = await client.post(f"{self.host}/api/chat", json=payload)
+                    resp.raise_for_status()
+                    data = resp.json()
+                    # Ollama returns {message: {role, content}}
+                    msg = data.get("message", {}).get("content")
+                    return msg or ""
+                # Streaming replies are one JSON object per line, each with a fragment.
+                parts: List[str] = []
+                async with client.stream("POST", f"{self.host}/api/chat", json=payload) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if not line:
+                            continue
+                        delta = json.loads(line).get("message", {}).get("content")
+                        if delta:
+                            parts.append(delta)
+                            await on_delta(delta)
+                return "".join(parts)
         except Exception as e:
             return f"[Ollama error: {e}]"
-
@@ -1,5 +1,7 @@
+import asyncio
 import os
-from typing import Optional
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
 
 from openai import AsyncOpenAI
 
@@ -7,19 +9,126 @@ from ..core import ContextSchema
 
 
 class OpenAIAdapter:
-    """Adapter for OpenAI LLM calls (async)."""
+    """Adapter for OpenAI LLM calls (async).
 
-    def __init__(self, api_key: str, model: Optional[str] = None):
+    Concurrent calls are capped by a semaphore and, when ``rpm``/``tpm`` are
+    set, paced by request and token buckets that refill continuously, so
+    bursts wait locally instead of drawing 429s from the API. Actual 429s are
+    still retried with backoff by the OpenAI client itself.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        model: Optional[str] = None,
+        *,
+        max_concurrency: Optional[int] = None,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+    ):
         self.client = AsyncOpenAI(api_key=api_key)
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        self.summary_model = os.getenv("OPENAI_SUMMARY_MODEL", "gpt-4o-mini")
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        self._sem = asyncio.Semaphore(max(1, max_concurrency))
+        # 0 disables the corresponding bucket
+        self._rpm = float(os.getenv("OPENAI_RPM", "0")) if rpm is None else rpm
+        self._tpm = float(os.getenv("OPENAI_TPM", "0")) if tpm is None else tpm
+        self._request_capacity = self._rpm
+        self._token_capacity = self._tpm
+        self._last_refill = time.monotonic()
+
+    @staticmethod
+    def _estimate_tokens(messages: list, completion_max_tokens: int) -> int:
+        # ~4 chars per token for the prompt, plus the full completion budget,
+        # which is what the API counts against TPM up front.
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        return prompt_chars // 4 + completion_max_tokens
+
+    async def _acquire_capacity(self, tokens: int) -> None:
+        if self._rpm <= 0 and self._tpm <= 0:
+            return
+        # A single oversized request may never fit a full bucket; cap its cost.
+        tokens = min(tokens, self._tpm) if self._tpm > 0 else 0
+        while True:
+            now = time.monotonic()
+            elapsed = now - self._last_refill
+            self._last_refill = now
+            if self._rpm > 0:
+                self._request_capacity = min(
+                    self._rpm, self._request_capacity + elapsed * self._rpm / 60
+                )
+            if self._tpm > 0:
+                self._token_capacity = min(
+                    self._tpm, self._token_capacity + elapsed * self._tpm / 60
+                )
+            request_short = 1 - self._request_capacity if self._rpm > 0 else 0
+            token_short = tokens - self._token_capacity if self._tpm > 0 else 0
+            if request_short <= 0 and token_short <= 0:
+                if self._rpm > 0:
+                    self._request_capacity -= 1
+                self._token_capacity -= tokens
+                return
+            wait = max(
+                request_short * 60 / self._rpm if request_short > 0 else 0,
+                token_short * 60 / self._tpm if token_short > 0 else 0,
+            )
+            await asyncio.sleep(wait)
+
+    async def call(
+        self,
+        context: ContextSchema,
+        *,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> str:
+        """Return the completion for ``context``.
 
-    async def call(self, context: ContextSchema) -> str:
-        messages = [{"role": "system", "content": context.system_prompt}] + context.history
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            max_tokens=context.completion_max_tokens,
-            temperature=0.7,
+        With ``on_delta`` the completion is streamed and each text fragment is
+        awaited through it as it arrives; the full text is still returned.
+        """
+        await self._acquire_capacity(
+            self._estimate_tokens(context.chat_messages(), context.completion_max_tokens)
         )
-        return response.choices[0].message.content
+        async with self._sem:
+            # Re-read after waiting: the list is shared and may have grown meanwhile.
+            messages = context.chat_messages()
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=context.completion_max_tokens,
+                temperature=0.7,
+                stream=on_delta is not None,
+            )
+            if on_delta is None:
+                return response.choices[0].message.content
+            parts: List[str] = []
+            async for chunk in response:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    await on_delta(delta)
+        return "".join(parts)
 
+    async def summarize(self, messages: List[Dict[str, str]], max_tokens: int = 200) -> str:
+        """Condense ``messages`` into a short summary (used for history compaction)."""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = [
+            {
+                "role": "system",
+                "content": (
+                    f"Summarize the following conversation in at most {max_tokens} tokens. "
+                    "Keep facts, decisions, addresses and amounts."
+                ),
+            },
+            {"role": "user", "content": transcript},
+        ]
+        await self._acquire_capacity(self._estimate_tokens(prompt, max_tokens))
+        async with self._sem:
+            response = await self.client.chat.completions.create(
+                model=self.summary_model,
+                messages=prompt,
+                max_tokens=max_tokens,
+                temperature=0,
+            )
+        return response.choices[0].message.content or ""
@@ -1,16 +1,46 @@
 import asyncio
 import os
 import random
+import time
+from collections import OrderedDict
+from decimal import Decimal
 from typing import Any, Callable, Optional
 
-from web3 import AsyncWeb3
-from web3.exceptions import Web3Exception
+import aiohttp
+from hexbytes import HexBytes
+from web3 import AsyncWeb3, WebSocketProvider
+from web3.exceptions import TimeExhausted, TransactionNotFound, Web3Exception, Web3RPCError
+from web3.method import Method
+from web3.providers.async_base import AsyncBaseProvider
+
+# Re-check for a receipt at least this often even if no new head arrives.
+_HEAD_WAIT_FALLBACK_SECONDS = 15.0
+# Intrinsic gas of a value transfer without calldata to an account with no code.
+_PLAIN_TRANSFER_GAS = 21_000
+# Units converted with plain integer arithmetic; others defer to web3's Decimal path.
+_WEI_PER_UNIT = {"wei": 1, "gwei": 10**9, "ether": 10**18}
+
+
+def _float_to_wei(v: float, factor: int) -> int:
+    """Scale ``v`` by ``factor`` using its shortest decimal repr, in integer math.
+
+    ``repr`` gives the decimal the caller wrote (0.1, not 0.1000000000000000055...),
+    so 0.1 ether is exactly 10**17 wei. Exponent forms fall back to one Decimal.
+    """
+    text = repr(v)
+    if "e" in text or "n" in text:  # 1e-05, inf, nan
+        return int(Decimal(text) * factor)
+    negative = text.startswith("-")
+    whole, _, frac = text.lstrip("-").partition(".")
+    digits = len(str(factor)) - 1
+    wei = int(whole) * factor + int(frac[:digits].ljust(digits, "0") or 0)
+    return -wei if negative else wei
 
 
 class Web3Adapter:
     """Adapter for Ethereum interactions with basic retry and RPC rotation."""
 
-    def __init__(self, rpc_url: str):
+    def __init__(self, rpc_url: str, ws_url: Optional[str] = None):
         # Gather URLs from explicit arg, optional Alchemy URLs, and fallbacks
         urls_env = [u.strip() for u in os.getenv("WEB3_RPC_URLS", "").split(",") if u.strip()]
         alchemy_http = os.getenv("ALCHEMY_HTTP_URL")
@@ -31,27 +61,107 @@ class Web3Adapter:
         self._urls = urls
         self._idx = 0
         self._current_url = self._urls[self._idx]
-        self.w3 = AsyncWeb3(self._make_provider(self._current_url))
+        # Per-request deadline: a stalled RPC fails over to the next URL instead
+        # of holding the call for the session-wide 30s limit.
+        self._rpc_timeout = float(os.getenv("AGENTVAULT_RPC_TIMEOUT", "10"))
+        self.w3 = self._make_w3(self._current_url)
+        # One pooled aiohttp session shared by every HTTP provider we rotate through
+        self._pool_size = int(os.getenv("AGENTVAULT_RPC_POOL", "128"))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_provider: Any = None
+        self._chain_id: Optional[int] = None
+        self._chain_id_lock = asyncio.Lock()
+        # Recipients recently seen without code: plain transfers to them skip
+        # estimate_gas. Least recently used first, capped at _eoa_max entries.
+        self._eoa_seen: OrderedDict[str, float] = OrderedDict()
+        self._eoa_ttl = float(os.getenv("AGENTVAULT_EOA_CACHE_TTL", "60"))
+        self._eoa_max = int(os.getenv("AGENTVAULT_EOA_CACHE_SIZE", "4096"))
+        # Last priority-fee suggestion and when it was fetched; it only moves per block
+        self._fee_cache: Optional[tuple[int, float]] = None
+        self._fee_ttl = float(os.getenv("AGENTVAULT_FEE_CACHE_TTL", "10"))
+        # When the current provider last answered is_connected(); calls made within
+        # the TTL skip the ping and let the real RPC surface any failure.
+        self._connected_at: Optional[float] = None
+        self._connection_ttl = float(os.getenv("AGENTVAULT_CONNECTION_TTL", "60"))
+        # Optional persistent websocket used for broadcasting and receipt waits
+        self._ws_url = ws_url or os.getenv("AGENTVAULT_WS_URL") or None
+        self._ws_w3: Optional[AsyncWeb3] = None
+        self._ws_lock = asyncio.Lock()
+        self._new_head = asyncio.Condition()
+        self._heads_task: Optional[asyncio.Task] = None
+        self._receipt_waiters = 0
+        self._head_poll_interval = float(os.getenv("AGENTVAULT_HEAD_POLL_SECONDS", "1"))
 
     def _make_provider(self, url: str):
         if url.startswith("ws://") or url.startswith("wss://"):
             return AsyncWeb3.AsyncWebsocketProvider(url)
-        return AsyncWeb3.AsyncHTTPProvider(url)
+        return AsyncWeb3.AsyncHTTPProvider(
+            url, request_kwargs={"timeout": aiohttp.ClientTimeout(total=self._rpc_timeout)}
+        )
+
+    def _make_w3(self, url: str) -> AsyncWeb3:
+        w3 = AsyncWeb3(self._make_provider(url))
+        # A plain, batchable eth_maxPriorityFeePerGas call; the public
+        # eth.max_priority_fee is a property and cannot be added to a batch.
+        w3.eth.attach_methods(
+            {"priority_fee_per_gas": Method("eth_maxPriorityFeePerGas", is_property=False)}
+        )
+        return w3
 
     def _rotate(self) -> None:
         self._idx = (self._idx + 1) % len(self._urls)
         self._current_url = self._urls[self._idx]
-        self.w3 = AsyncWeb3(self._make_provider(self._current_url))
+        self.w3 = self._make_w3(self._current_url)
+        self.invalidate_chain_id()
+        self._fee_cache = None
+        self._connected_at = None
 
     @property
     def current_rpc_url(self) -> str:
         return self._current_url
 
+    async def _bind_session(self) -> None:
+        provider = self.w3.provider
+        if provider is self._session_provider or not isinstance(
+            provider, AsyncWeb3.AsyncHTTPProvider
+        ):
+            return
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._pool_size,
+                limit_per_host=self._pool_size,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=30)
+            )
+        await provider.cache_async_session(self._session)
+        self._session_provider = provider
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP session (and websocket, if one was opened)."""
+        if self._heads_task is not None:
+            self._heads_task.cancel()
+        if self._ws_w3 is not None:
+            await self._ws_w3.provider.disconnect()
+            self._ws_w3 = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_provider = None
+        self._connected_at = None
+
     async def ensure_connection(self) -> bool:
+        connected_at = self._connected_at
+        if connected_at is not None and time.monotonic() - connected_at < self._connection_ttl:
+            return True
         # Try all providers until one connects
         for _ in range(len(self._urls)):
             try:
+                await self._bind_session()
                 if await self.w3.is_connected():
+                    self._connected_at = time.monotonic()
                     return True
             except Exception:
                 pass
@@ -63,6 +173,7 @@ class Web3Adapter:
         last_err: Optional[Exception] = None
         for _ in range(attempts * len(self._urls)):
             try:
+                await self._bind_session()
                 res = func()
                 if asyncio.iscoroutine(res):
                     return await res
@@ -77,32 +188,275 @@ class Web3Adapter:
         raise RuntimeError("RPC call failed")
 
     # Convenience wrappers with retry/rotation
+    async def chain_id(self) -> int:
+        """Chain id of the connected network, fetched once and memoised."""
+        if self._chain_id is None:
+            async with self._chain_id_lock:
+                if self._chain_id is None:
+                    self._chain_id = await self._call(lambda: self.w3.eth.chain_id)
+        return self._chain_id
+
+    def invalidate_chain_id(self) -> None:
+        self._chain_id = None
+
     async def get_nonce(self, address: str) -> int:
-        return await self._call(lambda: self.w3.eth.get_transaction_count(address))
+        # "pending" counts transactions still in the mempool, so back-to-back
+        # sends without waiting for receipts get consecutive nonces.
+        return await self._call(lambda: self.w3.eth.get_transaction_count(address, "pending"))
 
     async def get_block_latest(self) -> dict:
         return await self._call(lambda: self.w3.eth.get_block("latest"))
 
     async def max_priority_fee(self) -> int:
+        cached = self._cached_priority_fee()
+        if cached is not None:
+            return cached
+
         async def _fetch():
             return await self.w3.eth.max_priority_fee
 
-        return await self._call(_fetch)
+        return self._remember_priority_fee(await self._call(_fetch))
+
+    def _cached_priority_fee(self) -> Optional[int]:
+        cached = self._fee_cache
+        if cached is not None and time.monotonic() - cached[1] < self._fee_ttl:
+            return cached[0]
+        return None
+
+    def _remember_priority_fee(self, fee: int) -> int:
+        if self._fee_ttl > 0:
+            self._fee_cache = (fee, time.monotonic())
+        return fee
+
+    def _plain_transfer_to(self, txn: dict) -> Optional[str]:
+        to = txn.get("to")
+        return None if txn.get("data") or not to else to
+
+    def _known_eoa(self, txn: dict) -> bool:
+        to = self._plain_transfer_to(txn)
+        seen = self._eoa_seen.get(to) if to else None
+        if seen is None:
+            return False
+        if time.monotonic() - seen >= self._eoa_ttl:
+            del self._eoa_seen[to]
+            return False
+        self._eoa_seen.move_to_end(to)
+        return True
+
+    def _remember_code(self, address: str, code: bytes) -> None:
+        if code or self._eoa_ttl <= 0 or self._eoa_max <= 0:
+            return
+        now = time.monotonic()
+        seen = self._eoa_seen
+        seen[address] = now
+        seen.move_to_end(address)
+        # Drop from the least recently used end: anything over the cap, then
+        # anything expired, stopping at the first entry still fresh.
+        while len(seen) > self._eoa_max:
+            seen.popitem(last=False)
+        while seen:
+            oldest = next(iter(seen))
+            if now - seen[oldest] < self._eoa_ttl:
+                break
+            del seen[oldest]
 
     async def estimate_gas(self, txn: dict) -> int:
+        if self._known_eoa(txn):
+            return _PLAIN_TRANSFER_GAS
         return await self._call(lambda: self.w3.eth.estimate_gas(txn))
 
+    async def batch_transfer_context(
+        self, address: str, txn: dict
+    ) -> tuple[int, int, dict, int, int]:
+        """Nonce, priority fee, latest block, gas estimate and balance in one JSON-RPC batch.
+
+        Providers without batch support get concurrent individual (retrying)
+        calls instead. Plain transfers to a recipient already known to have no
+        code use the fixed 21000 gas; otherwise the recipient's code rides
+        along so the next transfer to it can skip the estimate. A priority fee
+        fetched within the fee-cache TTL is reused, not re-requested.
+        """
+        delay = 0.25
+        attempts = 3 * len(self._urls)
+        for attempt in range(attempts):
+            await self._bind_session()
+            if not self._supports_batching():
+                nonce, priority_fee, block, gas, balance = await asyncio.gather(
+                    self.get_nonce(address),
+                    self.max_priority_fee(),
+                    self.get_block_latest(),
+                    self.estimate_gas(txn),
+                    self.get_balance(address),
+                )
+                return nonce, priority_fee, block, gas, balance
+            # JSON-RPC errors (e.g. an estimate_gas revert) propagate: the node
+            # answered, and re-running the batch elsewhere would fail the same way.
+            # Transport failures rotate and retry like _call.
+            try:
+                return await self._transfer_context_batch(address, txn)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == attempts - 1:
+                    raise
+                self._rotate()
+                await asyncio.sleep(delay + random.random() * 0.25)
+                delay = min(delay * 2, 2.0)
+        raise RuntimeError("RPC call failed")
+
+    async def _transfer_context_batch(
+        self, address: str, txn: dict
+    ) -> tuple[int, int, dict, int, int]:
+        known_eoa = self._known_eoa(txn)
+        to = None if known_eoa else self._plain_transfer_to(txn)
+        priority_fee = self._cached_priority_fee()
+        async with self.w3.batch_requests() as batch:
+            batch.add(self.w3.eth.get_transaction_count(address, "pending"))
+            if priority_fee is None:
+                batch.add(self.w3.eth.priority_fee_per_gas())
+            batch.add(self.w3.eth.get_block("latest"))
+            batch.add(self.w3.eth.get_balance(address))
+            if not known_eoa:
+                batch.add(self.w3.eth.estimate_gas(txn))
+            if to:
+                batch.add(self.w3.eth.get_code(to))
+            results = iter(await batch.async_execute())
+        nonce = next(results)
+        if priority_fee is None:
+            fee = next(results)
+            priority_fee = self._remember_priority_fee(
+                int(fee, 16) if isinstance(fee, str) else int(fee)
+            )
+        block = next(results)
+        balance = next(results)
+        gas = _PLAIN_TRANSFER_GAS if known_eoa else next(results)
+        if to:
+            self._remember_code(to, next(results))
+        return nonce, priority_fee, block, gas, balance
+
     async def send_raw_transaction(self, raw: bytes) -> Any:
+        if self._ws_url:
+            w3 = await self._ws_connection()
+            return await w3.eth.send_raw_transaction(raw)
         return await self._call(lambda: self.w3.eth.send_raw_transaction(raw))
 
+    def _supports_batching(self) -> bool:
+        """True when the current provider implements JSON-RPC batch requests."""
+        make_batch = getattr(type(self.w3.provider), "make_batch_request", None)
+        return make_batch is not None and make_batch is not AsyncBaseProvider.make_batch_request
+
+    async def send_raw_transactions(self, raws: list[bytes]) -> list[Any]:
+        """Broadcast several signed transactions in one JSON-RPC batch.
+
+        Providers without batch support get sequential ``send_raw_transaction``
+        calls instead. A batch that was sent is never re-broadcast: a rejected
+        entry raises ``Web3RPCError`` naming it, and any transport error
+        propagates, since some of the transactions may already be in the mempool.
+        """
+        await self._bind_session()
+        if not self._supports_batching():
+            return [await self.send_raw_transaction(raw) for raw in raws]
+        responses = await self.w3.provider.make_batch_request(
+            [("eth_sendRawTransaction", ["0x" + bytes(raw).hex()]) for raw in raws]
+        )
+        if not isinstance(responses, list):
+            # The node answered the whole batch with a single error object.
+            raise Web3RPCError(f"Batch broadcast rejected: {responses}", rpc_response=responses)
+        failed = [(i, r["error"]) for i, r in enumerate(responses) if r.get("error") is not None]
+        if failed:
+            i, error = failed[0]
+            raise Web3RPCError(
+                f"{len(failed)} of {len(raws)} transactions rejected, the rest were "
+                f"broadcast; first rejected #{i + 1}: {error.get('message', error)}",
+                rpc_response=responses[i],
+            )
+        return [HexBytes(r["result"]) for r in responses]
+
     async def wait_for_receipt(self, tx_hash: Any, timeout: int = 120) -> Any:
-        return await self._call(lambda: self.w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout))
+        try:
+            return await asyncio.wait_for(self._receipt_on_new_heads(tx_hash), timeout)
+        except asyncio.TimeoutError:
+            shown = HexBytes(tx_hash).to_0x_hex() if isinstance(tx_hash, bytes) else tx_hash
+            raise TimeExhausted(
+                f"Transaction {shown} has no receipt after {timeout} seconds"
+            ) from None
+
+    # Receipt path: one shared head watcher (newHeads over the websocket, or
+    # eth_blockNumber polling over HTTP) wakes all pending receipt waiters, so
+    # each waiter issues one receipt lookup per block instead of polling alone.
+    async def _ws_connection(self) -> AsyncWeb3:
+        async with self._ws_lock:
+            if self._ws_w3 is None:
+                self._ws_w3 = await AsyncWeb3(WebSocketProvider(self._ws_url))
+            return self._ws_w3
+
+    async def _watch_heads(self) -> None:
+        w3 = await self._ws_connection()
+        await w3.eth.subscribe("newHeads")
+        async for _ in w3.socket.process_subscriptions():
+            async with self._new_head:
+                self._new_head.notify_all()
+
+    async def _poll_heads(self) -> None:
+        last_block: Optional[int] = None
+        while self._receipt_waiters:
+            try:
+                await self._bind_session()
+                block_number = await self.w3.eth.block_number
+            except Exception:
+                block_number = last_block  # transient; the waiters' fallback re-check covers it
+            if block_number != last_block:
+                last_block = block_number
+                async with self._new_head:
+                    self._new_head.notify_all()
+            await asyncio.sleep(self._head_poll_interval)
+
+    async def _wait_for_head(self) -> None:
+        task = self._heads_task
+        if task is None or task.done():
+            if self._ws_url:
+                if task is not None and not task.cancelled() and task.exception() is not None:
+                    self._ws_w3 = None  # subscription died; reconnect on next use
+                self._heads_task = asyncio.create_task(self._watch_heads())
+            else:
+                self._heads_task = asyncio.create_task(self._poll_heads())
+        async with self._new_head:
+            try:
+                await asyncio.wait_for(self._new_head.wait(), _HEAD_WAIT_FALLBACK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _receipt_on_new_heads(self, tx_hash: Any) -> Any:
+        self._receipt_waiters += 1
+        # Consecutive lookup failures; one full pass over the providers is
+        # enough to tell a persistent error (bad hash, auth) from a flaky node.
+        failures = 0
+        try:
+            while True:
+                if self._ws_url:
+                    w3 = await self._ws_connection()
+                else:
+                    await self._bind_session()
+                    w3 = self.w3
+                try:
+                    return await w3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    failures = 0
+                except Exception:
+                    failures += 1
+                    if self._ws_url or failures >= len(self._urls):
+                        raise
+                    self._rotate()
+                    continue
+                await self._wait_for_head()
+        finally:
+            self._receipt_waiters -= 1
 
     async def get_balance(self, address: str) -> int:
         return await self._call(lambda: self.w3.eth.get_balance(address))
 
     async def get_code(self, address: str) -> bytes:
-        return await self._call(lambda: self.w3.eth.get_code(address))
+        code = await self._call(lambda: self.w3.eth.get_code(address))
+        self._remember_code(address, code)
+        return code
 
     async def call_contract_function(
         self, address: str, abi: list[dict[str, Any]], method: str, *args: Any
@@ -113,10 +467,18 @@ class Web3Adapter:
 
     # Pure helpers
     def to_wei(self, v: float, unit: str) -> int:
-        return self.w3.to_wei(v, unit)
+        factor = _WEI_PER_UNIT.get(unit)
+        if factor is None or isinstance(v, bool) or not isinstance(v, (int, float)):
+            return self.w3.to_wei(v, unit)
+        if isinstance(v, int):
+            return v * factor
+        return _float_to_wei(v, factor)
 
     def from_wei(self, v: int, unit: str) -> float:
-        return float(self.w3.from_wei(v, unit))
+        factor = _WEI_PER_UNIT.get(unit)
+        if factor is None or isinstance(v, bool) or not isinstance(v, int):
+            return float(self.w3.from_wei(v, unit))
+        return v / factor
 
     def is_address(self, addr: str) -> bool:
         return self.w3.is_address(addr)
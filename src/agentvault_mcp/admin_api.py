@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from fastapi import FastAPI, Depends, Query, HTTPException
+from fastapi.responses import JSONResponse, ORJSONResponse
 from pydantic import BaseModel
 from typing import Any, Optional
 from datetime import timedelta, datetime, timezone
@@ -8,6 +9,11 @@ from datetime import timedelta, datetime, timezone
 from .db.repositories import EventRepository
 from .policy import PolicyConfig, PolicyEngine
 
+try:
+    import orjson  # type: ignore
+except Exception:  # Optional dependency; responses fall back to the stdlib encoder
+    orjson = None  # type: ignore
+
 
 class EventModel(BaseModel):
     id: str
@@ -32,7 +38,11 @@ class UsageRecord(BaseModel):
 
 
 def create_app(policy_engine: PolicyEngine) -> FastAPI:
-    app = FastAPI(title="VaultPilot Admin API", version="0.1")
+    app = FastAPI(
+        title="VaultPilot Admin API",
+        version="0.1",
+        default_response_class=ORJSONResponse if orjson is not None else JSONResponse,
+    )
 
     def get_policy_engine() -> PolicyEngine:
         return policy_engine
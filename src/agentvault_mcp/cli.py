@@ -26,6 +26,10 @@ from .strategy_manager import StrategyManager
 from .ui import write_tipjar_page, write_dashboard_page
 
 
+# Managers built for the running command; closed by _run_command when it exits.
+_open_managers: list[tuple[ContextManager, AgentWalletManager, PolicyEngine]] = []
+
+
 def _init_managers() -> tuple[ContextManager, AgentWalletManager, PolicyEngine]:
     from .config import (
         get_rpc_url,
@@ -47,9 +51,22 @@ def _init_managers() -> tuple[ContextManager, AgentWalletManager, PolicyEngine]:
     policy_path = get_policy_path()
     policy_config = PolicyConfig.load(policy_path)
     policy_engine = PolicyEngine(mgr.session_maker, policy_config, config_path=policy_path)
+    _open_managers.append((ctx, mgr, policy_engine))
     return ctx, mgr, policy_engine
 
 
+async def _run_command(args) -> None:
+    try:
+        await args.func(args)
+    finally:
+        while _open_managers:
+            _, mgr, policy_engine = _open_managers.pop()
+            try:
+                await policy_engine.flush_events()
+            finally:
+                await mgr.web3.aclose()
+
+
 async def _cmd_create_wallet(args):
     _, mgr, _ = _init_managers()
     addr = await mgr.spin_up_wallet(args.agent_id)
@@ -207,12 +224,12 @@ async def _cmd_dashboard(args):
     sm = StrategyManager(mgr)
     wallets = []
     wallet_map = await mgr.list_wallets()
+    balances = await mgr.query_balances(wallet_map)
     for aid, address in wallet_map.items():
-        try:
-            bal = await mgr.query_balance(aid)
-        except Exception:
-            bal = "?"
-        wallets.append({"agent_id": aid, "address": address, "balance_eth": bal})
+        bal = balances.get(aid)
+        wallets.append(
+            {"agent_id": aid, "address": address, "balance_eth": "?" if bal is None else bal}
+        )
     out = args.out or "agentvault-dashboard.html"
     strategies = await sm.list_strategies()
     async with policy_engine.session_maker() as session:
@@ -384,4 +401,4 @@ def main() -> None:  # pragma: no cover
     api.set_defaults(func=_cmd_admin_api)
 
     args = p.parse_args()
-    asyncio.run(args.func(args))
+    asyncio.run(_run_command(args))
@@ -1,15 +1,24 @@
+import asyncio
+import inspect
+import json
 import os
 import logging
-from typing import Any, Dict, List, Optional, Literal
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Literal, Tuple
 
 import structlog
 try:
     import tiktoken  # type: ignore
 except Exception:  # Optional dependency; fallback used if unavailable
     tiktoken = None  # type: ignore
-from pydantic import BaseModel, Field, field_validator
+try:
+    import orjson  # type: ignore
+except Exception:  # Optional dependency; log lines fall back to the stdlib encoder
+    orjson = None  # type: ignore
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 
 from . import MCPError, ContextOverflowError
+from . import semantic
 
 
 # Configure stdlib logging level from env before structlog setup
@@ -17,9 +26,21 @@ _log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=getattr(logging, _log_level, logging.INFO))
 
 
+def _orjson_log_dumps(event_dict: Dict[str, Any], **kw: Any) -> str:
+    # structlog passes default= for values JSON cannot represent (repr fallback).
+    try:
+        return orjson.dumps(
+            event_dict, default=kw.get("default"), option=orjson.OPT_NON_STR_KEYS
+        ).decode()
+    except TypeError:
+        # Ints beyond 64 bits (wei amounts) never reach default=; the stdlib encoder takes them.
+        return json.dumps(event_dict, **kw)
+
+
 # Structured logging setup
 structlog.configure(
     processors=[
+        structlog.contextvars.merge_contextvars,
         structlog.stdlib.filter_by_level,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
@@ -27,7 +48,9 @@ structlog.configure(
         structlog.processors.TimeStamper(fmt="iso"),
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
-        structlog.processors.JSONRenderer(),
+        structlog.processors.JSONRenderer(
+            serializer=_orjson_log_dumps if orjson is not None else json.dumps
+        ),
     ],
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
@@ -36,6 +59,29 @@ structlog.configure(
 )
 logger = structlog.get_logger("agentvault_mcp")
 
+# Below this many uncounted messages the thread pool of a batch encode costs
+# more than it saves.
+_BATCH_ENCODE_MIN = 16
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(encoding_name: str):
+    """Shared tiktoken encoding (falls back to cl100k_base), or None without tiktoken.
+
+    Loading the BPE ranks is the expensive part, so every ContextManager using
+    the same encoding shares one instance; the empty encode warms the Rust side.
+    """
+    if tiktoken is None:
+        return None
+    for name in (encoding_name, "cl100k_base"):
+        try:
+            encoding = tiktoken.get_encoding(name)
+        except Exception:
+            continue
+        encoding.encode_ordinary("")
+        return encoding
+    return None
+
 
 class ContextSchema(BaseModel):
     """MCP Protocol Schema: Validates and structures context."""
@@ -66,6 +112,45 @@ class ContextSchema(BaseModel):
                 raise ValueError("History messages must have 'role' and 'content'.")
         return v
 
+    # System message + history, kept in step by chat_messages() / drop_oldest()
+    _messages: List[Dict[str, str]] = PrivateAttr(default_factory=list)
+
+    def chat_messages(self) -> List[Dict[str, str]]:
+        """The system prompt followed by history, as chat APIs expect.
+
+        The list is maintained incrementally rather than rebuilt per call, so
+        it is shared: callers must not mutate it.
+        """
+        msgs = self._messages
+        history = self.history
+        mirrored = len(msgs) - 1
+        if mirrored < 0 or mirrored > len(history) or (
+            mirrored and (msgs[1] is not history[0] or msgs[-1] is not history[mirrored - 1])
+        ):
+            # First call, or history was replaced/shrunk outside drop_oldest.
+            msgs[:] = [{"role": "system", "content": self.system_prompt}]
+            mirrored = 0
+        elif msgs[0]["content"] != self.system_prompt:
+            msgs[0] = {"role": "system", "content": self.system_prompt}
+        msgs.extend(history[mirrored:])
+        return msgs
+
+    def drop_oldest(self, count: int) -> None:
+        """Remove the ``count`` oldest history messages (and their mirrored copies)."""
+        del self.history[:count]
+        del self._messages[1 : 1 + count]
+
+    def replace_oldest(self, count: int, message: Dict[str, str]) -> None:
+        """Replace the ``count`` oldest history messages with ``message``."""
+        self.history[:count] = [message]
+        self._messages[1 : 1 + count] = [message]
+
+    def drop_indices(self, indices: Iterable[int]) -> None:
+        """Remove the history messages at ``indices``; the mirror is rebuilt on next use."""
+        for i in sorted(indices, reverse=True):
+            del self.history[i]
+        self._messages.clear()
+
 
 class ContextManager:
     """Core MCP: Manages context with trimming and state injection."""
@@ -79,17 +164,28 @@ class ContextManager:
     ):
         self.schema = ContextSchema(max_tokens=max_tokens, trim_strategy=trim_strategy)
         self.encoding_name = encoding_name
-        self.encoding = None
-        if tiktoken is not None:
-            try:
-                self.encoding = tiktoken.get_encoding(encoding_name)
-            except Exception:
-                try:
-                    self.encoding = tiktoken.get_encoding("cl100k_base")
-                except Exception:
-                    self.encoding = None
+        self.encoding = _get_encoding(encoding_name)
         self.logger = logger.bind(component="ContextManager")
         self.adapters: Dict[str, Any] = {}
+        # State keys holding a per-agent dict (e.g. "wallets" -> {agent_id: ...})
+        self._namespaces: set[str] = set()
+        # Per-message token counts, parallel to schema.history, and their sum
+        self._msg_tokens: List[int] = []
+        self._msg_token_total = 0
+        self._sys_prompt_counted: Optional[str] = None
+        self._sys_tokens = 0
+        self.embedding_model = os.getenv("MCP_EMBEDDING_MODEL", semantic.DEFAULT_EMBEDDING_MODEL)
+        # sha256(content) -> float16 embedding, pruned to live history after each trim
+        self._embeddings: Dict[bytes, Any] = {}
+        self._semantic_disabled = False
+        self._semantic_trim_warned = False
+        # Summarise recency-trimmed messages through the "openai" adapter instead
+        # of discarding them (adapters without summarize() fall back to dropping).
+        self.compact_history = os.getenv("MCP_COMPACT_HISTORY") == "1"
+        self._compacting = False
+        # Trims may await (summaries, embeddings); serialise them so two trims
+        # never cut the same prefix.
+        self._trim_lock = asyncio.Lock()
 
     def register_adapter(self, name: str, adapter: Any):
         """Dependency injection for adapters."""
@@ -101,59 +197,231 @@ class ContextManager:
         self.schema.history.append({"role": role, "content": content})
         await self._trim_context()
 
+    async def commit(
+        self,
+        state_updates: Mapping[str, Any],
+        history_entries: Iterable[Tuple[str, str]],
+        *,
+        namespace: Optional[str] = None,
+    ) -> None:
+        """Apply several state updates and history entries with a single trim pass."""
+        self._state_target(namespace).update(state_updates)
+        self.schema.history.extend(
+            {"role": role, "content": content} for role, content in history_entries
+        )
+        await self._trim_context()
+        self.logger.debug("Context committed", keys=list(state_updates))
+
     async def _trim_context(self) -> None:
-        """Apply trimming strategy atomically."""
+        """Apply trimming strategy atomically.
+
+        A compaction's summary call runs outside the lock; its result is
+        applied only if the summarised prefix is still in place.
+        """
+        async with self._trim_lock:
+            prefix = await self._trim_locked(compact=True)
+        if prefix is None:
+            return
+        try:
+            summary = await self._summarize(prefix)
+        finally:
+            self._compacting = False
+        async with self._trim_lock:
+            if summary is not None:
+                self._apply_summary(prefix, summary)
+            # Messages appended meanwhile, or a discarded summary, may leave
+            # the context over budget; finish with a plain trim.
+            await self._trim_locked(compact=False)
+
+    async def _trim_locked(self, *, compact: bool) -> Optional[List[Dict[str, str]]]:
+        """Trim under ``_trim_lock``; returns the prefix to summarise, if any."""
         token_count = self._calculate_tokens()
         if token_count > self.schema.max_tokens * 0.9:  # Proactive trim
-            if self.schema.trim_strategy == "recency":
-                while (
-                    token_count > self.schema.max_tokens * 0.8
-                    and len(self.schema.history) > 1
-                ):
-                    removed = self.schema.history.pop(0)
-                    token_count = self._calculate_tokens()
-                    self.logger.debug("Trimmed message", removed=removed["role"])
-            else:  # Semantic: Placeholder for embeddings (implement with sentence-transformers in extension)
-                if not getattr(self, "_semantic_trim_warned", False):
-                    self.logger.warning(
-                        "Semantic trim requested but not implemented in base"
-                    )
-                    self._semantic_trim_warned = True
-                # For production, integrate FAISS here with pre-computed embeddings
-            if self._calculate_tokens() > self.schema.max_tokens:
+            target = self.schema.max_tokens * 0.8
+            trimmed = self.schema.trim_strategy == "semantic" and await self._trim_semantic(
+                token_count - target
+            )
+            if not trimmed:
+                # Find the cut from the cached counts, then drop the prefix with one
+                # slice delete instead of shifting the list on every pop(0).
+                history = self.schema.history
+                over_budget = token_count > self.schema.max_tokens
+                drop = 0
+                while token_count > target and len(history) - drop > 1:
+                    token_count -= self._msg_tokens[drop]
+                    drop += 1
+                if drop > 1 and compact and not self._compacting and self._can_compact():
+                    self._compacting = True
+                    return history[:drop]
+                if self._compacting and not over_budget:
+                    # The summary in flight will shrink the prefix; don't cut it now.
+                    return None
+                if drop:
+                    removed_roles = [msg["role"] for msg in history[:drop]]
+                    self._msg_token_total -= sum(self._msg_tokens[:drop])
+                    self.schema.drop_oldest(drop)
+                    del self._msg_tokens[:drop]
+                    self.logger.debug("Trimmed messages", removed=removed_roles)
+            token_count = self._calculate_tokens()
+            if token_count > self.schema.max_tokens:
                 raise ContextOverflowError(
-                    f"Context overflow after trim: {self._calculate_tokens()} tokens"
+                    f"Context overflow after trim: {token_count} tokens"
                 )
+        return None
+
+    def _can_compact(self) -> bool:
+        return self.compact_history and hasattr(self.adapters.get("openai"), "summarize")
+
+    async def _summarize(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """An LLM-written summary of ``messages``, or None if the call fails."""
+        try:
+            return await self.adapters["openai"].summarize(messages)
+        except Exception as exc:
+            self.logger.warning("History compaction failed; dropping instead", error=str(exc))
+            return None
+
+    def _apply_summary(self, prefix: List[Dict[str, str]], summary: str) -> None:
+        """Replace ``prefix`` with one summary message if it still opens the history."""
+        history = self.schema.history
+        count = len(prefix)
+        if len(history) < count or any(a is not b for a, b in zip(history, prefix)):
+            self.logger.debug("History changed during compaction; summary discarded")
+            return
+        self._sync_history_tokens()
+        message = {"role": "system", "content": f"[prior context summary] {summary}"}
+        tokens = self._count_tokens([message["content"]])[0]
+        self._msg_token_total += tokens - sum(self._msg_tokens[:count])
+        self._msg_tokens[:count] = [tokens]
+        self.schema.replace_oldest(count, message)
+        self.logger.debug("Compacted messages", replaced=count, summary_tokens=tokens)
+
+    async def _trim_semantic(self, excess: float) -> bool:
+        """Drop the most redundant messages by embedding similarity.
+
+        Returns False when nothing was dropped, so the caller falls back to
+        recency trimming: the ``semantic`` extra is missing, the model or
+        index failed, or no message qualified.
+        """
+        if self._semantic_disabled:
+            return False
+        try:
+            embedder = await asyncio.to_thread(semantic.load_embedder, self.embedding_model)
+        except Exception as exc:
+            # e.g. the model download failed; don't retry it on every trim
+            self._semantic_disabled = True
+            self._warn_semantic_fallback("Embedding model failed to load", error=str(exc))
+            return False
+        if embedder is None:
+            self._warn_semantic_fallback("Semantic trim needs the 'semantic' extra")
+            return False
+        history = self.schema.history
+        contents = [msg["content"] for msg in history]
+        try:
+            dropped = await asyncio.to_thread(
+                semantic.select_redundant,
+                embedder,
+                contents,
+                list(self._msg_tokens),
+                excess,
+                self._embeddings,
+            )
+        except Exception as exc:
+            self._warn_semantic_fallback("Semantic trim failed", error=str(exc))
+            return False
+        if dropped:
+            removed_roles = [history[i]["role"] for i in dropped]
+            for i in sorted(dropped, reverse=True):
+                self._msg_token_total -= self._msg_tokens[i]
+                del self._msg_tokens[i]
+            self.schema.drop_indices(dropped)
+            self.logger.debug("Trimmed messages", removed=removed_roles, strategy="semantic")
+        live = {semantic.content_key(msg["content"]) for msg in self.schema.history}
+        self._embeddings = {k: v for k, v in self._embeddings.items() if k in live}
+        return bool(dropped)
+
+    def _warn_semantic_fallback(self, message: str, **kw: Any) -> None:
+        if not self._semantic_trim_warned:
+            self.logger.warning(f"{message}; falling back to recency", **kw)
+            self._semantic_trim_warned = True
 
     def _calculate_tokens(self) -> int:
-        # Prefer tiktoken when available; otherwise use a heuristic
+        """Prompt + history + state token estimate; only uncounted text is encoded."""
+        prompt = self.schema.system_prompt
+        if prompt != self._sys_prompt_counted:
+            self._sys_tokens = self._count_tokens([prompt])[0]
+            self._sys_prompt_counted = prompt
+        self._sync_history_tokens()
+        return self._sys_tokens + self._msg_token_total + self._state_entries() * 10
+
+    def _sync_history_tokens(self) -> None:
+        history = self.schema.history
+        counted = len(self._msg_tokens)
+        if counted > len(history):
+            # History was shrunk or replaced outside this class; recount it all.
+            self._msg_tokens = []
+            self._msg_token_total = 0
+            counted = 0
+        if counted < len(history):
+            fresh = self._count_tokens([msg["content"] for msg in history[counted:]])
+            self._msg_tokens.extend(fresh)
+            self._msg_token_total += sum(fresh)
+
+    def _count_tokens(self, texts: List[str]) -> List[int]:
+        # Prefer tiktoken when available; otherwise use a heuristic.
+        # Chat content is plain text, so encode_ordinary skips the special-token scan.
         if self.encoding is not None:
-            sys_tokens = len(self.encoding.encode(self.schema.system_prompt))
-            hist_tokens = sum(
-                len(self.encoding.encode(msg["content"]))
-                for msg in self.schema.history
-            )
-            return sys_tokens + hist_tokens + len(self.schema.state) * 10
+            if len(texts) >= _BATCH_ENCODE_MIN:
+                # Cold start or bulk history restore: tiktoken spreads the batch
+                # over a thread pool with the GIL released.
+                batch = self.encoding.encode_ordinary_batch(
+                    texts, num_threads=os.cpu_count() or 1
+                )
+                return [len(tokens) for tokens in batch]
+            return [len(self.encoding.encode_ordinary(text)) for text in texts]
         # Heuristic fallback: ~4 chars per token
-        sys_tokens = max(1, len(self.schema.system_prompt) // 4)
-        hist_tokens = sum(max(1, len(msg["content"]) // 4) for msg in self.schema.history)
-        return sys_tokens + hist_tokens + len(self.schema.state) * 10
+        return [max(1, len(text) // 4) for text in texts]
+
+    def _state_entries(self) -> int:
+        state = self.schema.state
+        nested = sum(len(state.get(ns, ())) for ns in self._namespaces)
+        return len(state) - len(self._namespaces & state.keys()) + nested
+
+    def _state_target(self, namespace: Optional[str]) -> Dict[str, Any]:
+        if namespace is None:
+            return self.schema.state
+        self._namespaces.add(namespace)
+        return self.schema.state.setdefault(namespace, {})
 
     async def generate_response(
-        self, user_message: str, adapter_name: str = "openai"
+        self,
+        user_message: str,
+        adapter_name: str = "openai",
+        *,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
     ) -> str:
-        """Full cycle: Append, call adapter, append response."""
+        """Full cycle: Append, call adapter, append response.
+
+        ``on_delta`` receives reply fragments as they are generated. Adapters
+        whose ``call`` takes no ``on_delta`` deliver the whole reply as one
+        fragment.
+        """
         if adapter_name not in self.adapters:
             raise MCPError(f"Adapter {adapter_name} not registered")
 
         await self.append_to_history("user", user_message)
         adapter = self.adapters[adapter_name]
-        reply = await adapter.call(self.schema)
+        if on_delta is None:
+            reply = await adapter.call(self.schema)
+        elif "on_delta" in inspect.signature(adapter.call).parameters:
+            reply = await adapter.call(self.schema, on_delta=on_delta)
+        else:
+            reply = await adapter.call(self.schema)
+            await on_delta(reply)
         await self.append_to_history("assistant", reply)
         self.logger.info("Response generated", tokens=self._calculate_tokens())
         return reply
 
-    def update_state(self, key: str, value: Any) -> None:
-        """Inject state (e.g., wallet info) into schema."""
-        self.schema.state[key] = value
-        self.logger.debug("State updated", key=key)
+    def update_state(self, key: str, value: Any, *, namespace: Optional[str] = None) -> None:
+        """Inject state (e.g., wallet info) into schema, optionally under a namespace dict."""
+        self._state_target(namespace)[key] = value
+        self.logger.debug("State updated", key=key, namespace=namespace)
@@ -0,0 +1,56 @@
+"""Symmetric encryption helpers for wallet key material."""
+
+from __future__ import annotations
+
+import base64
+import os
+
+from cryptography.exceptions import InvalidTag
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# Leading byte of AES-GCM blobs; Fernet tokens are base64 text and never start with it.
+_GCM_VERSION = b"\x01"
+_GCM_NONCE_LEN = 12
+
+
+class KeyCipher:
+    """AES-256-GCM encryption of wallet private keys, bound to the agent id.
+
+    Blobs are ``0x01 || nonce(12) || ciphertext+tag`` with the agent id as
+    associated data, so a ciphertext copied onto another agent's row fails
+    to decrypt. The GCM key is derived from the Fernet-format ``ENCRYPT_KEY``
+    via HKDF; Fernet tokens written before the switch still decrypt.
+    """
+
+    def __init__(self, key: bytes | str) -> None:
+        # Only decrypts legacy blobs; everything new is written as AES-GCM.
+        self._fernet = Fernet(key)
+        hkdf = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=b"agentvault-wallet-aesgcm",
+        )
+        self._aead = AESGCM(hkdf.derive(base64.urlsafe_b64decode(key)))
+
+    @staticmethod
+    def is_current(blob: bytes) -> bool:
+        """True for AES-GCM blobs; False for legacy Fernet tokens that should be resealed."""
+        return blob[:1] == _GCM_VERSION
+
+    def encrypt(self, data: bytes, agent_id: str) -> bytes:
+        nonce = os.urandom(_GCM_NONCE_LEN)
+        return _GCM_VERSION + nonce + self._aead.encrypt(nonce, data, agent_id.encode())
+
+    def decrypt(self, blob: bytes, agent_id: str) -> bytes:
+        """Decrypt a stored key; raises ``InvalidToken`` on any authentication failure."""
+        if blob[:1] != _GCM_VERSION:
+            return self._fernet.decrypt(blob)
+        nonce = blob[1 : 1 + _GCM_NONCE_LEN]
+        try:
+            return self._aead.decrypt(nonce, blob[1 + _GCM_NONCE_LEN :], agent_id.encode())
+        except InvalidTag as exc:
+            raise InvalidToken from exc
@@ -1,16 +1,35 @@
 from __future__ import annotations
 
+import json
 import os
 from functools import lru_cache
 from typing import Optional
 
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.engine import Engine
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+try:
+    import orjson  # type: ignore
+except Exception:  # Optional dependency; JSON columns fall back to the stdlib encoder
+    orjson = None  # type: ignore
 
 _DEFAULT_DB_URL = "sqlite+aiosqlite:///vaultpilot.db"
 _SYNC_SQLITE_FALLBACK = "sqlite+pysqlite:///vaultpilot.db"
 
+# Applied to every new SQLite connection: WAL lets readers run alongside the
+# writer and, with synchronous=NORMAL, commits no longer fsync on every write.
+# VAULTPILOT_SQLITE_SYNCHRONOUS=OFF drops the remaining checkpoint fsyncs for
+# throwaway databases such as the test suite's.
+_SQLITE_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+)
+
 
 def _coerce_database_url(url: Optional[str]) -> str:
     if url:
@@ -18,10 +37,60 @@ def _coerce_database_url(url: Optional[str]) -> str:
     return os.getenv("VAULTPILOT_DATABASE_URL", _DEFAULT_DB_URL)
 
 
+def _is_file_sqlite(url: str) -> bool:
+    if not url.startswith("sqlite"):
+        return False
+    path = url.split("://", 1)[-1].lstrip("/")
+    return bool(path) and ":memory:" not in path and "mode=memory" not in path
+
+
+def _sqlite_synchronous() -> str:
+    mode = os.getenv("VAULTPILOT_SQLITE_SYNCHRONOUS", "NORMAL").upper()
+    return mode if mode in _SQLITE_SYNCHRONOUS_MODES else "NORMAL"
+
+
+def _orjson_dumps(value) -> str:
+    # OPT_NON_STR_KEYS matches json.dumps, which coerces int/float/bool keys to strings.
+    try:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    except TypeError:
+        # orjson rejects ints beyond 64 bits (wei amounts, uint256 values); the
+        # stdlib encoder handles them and raises for anything truly unserialisable.
+        return json.dumps(value)
+
+
+def _engine_options(url: str) -> dict:
+    options: dict = {}
+    if orjson is not None:
+        # Event request/response payloads are JSON columns written on every
+        # policy-gated tool call.
+        options["json_serializer"] = _orjson_dumps
+        options["json_deserializer"] = orjson.loads
+    if url.startswith("sqlite") and not _is_file_sqlite(url):
+        # Every new connection to :memory: opens its own empty database, so
+        # in-memory engines hold one connection shared by all sessions.
+        options["poolclass"] = StaticPool
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def _apply_sqlite_pragmas(engine: Engine) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, _record) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma in _SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.execute(f"PRAGMA synchronous={_sqlite_synchronous()}")
+        cursor.close()
+
+
 @lru_cache
 def get_async_engine(database_url: Optional[str] = None) -> AsyncEngine:
     url = _coerce_database_url(database_url)
-    return create_async_engine(url, pool_pre_ping=True, future=True)
+    engine = create_async_engine(url, pool_pre_ping=True, future=True, **_engine_options(url))
+    if _is_file_sqlite(url):
+        _apply_sqlite_pragmas(engine.sync_engine)
+    return engine
 
 
 @lru_cache
@@ -29,7 +98,10 @@ def get_sync_engine(database_url: Optional[str] = None) -> Engine:
     url = _coerce_database_url(database_url)
     if url.startswith("sqlite+aiosqlite"):
         url = url.replace("sqlite+aiosqlite", "sqlite+pysqlite")
-    return create_engine(url, pool_pre_ping=True, future=True)
+    engine = create_engine(url, pool_pre_ping=True, future=True, **_engine_options(url))
+    if _is_file_sqlite(url):
+        _apply_sqlite_pragmas(engine)
+    return engine
 
 
 @lru_cache
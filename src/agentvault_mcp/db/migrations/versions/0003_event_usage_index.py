@@ -0,0 +1,24 @@
+"""covering index for event usage queries"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0003_event_usage_index"
+down_revision = "0002_multi_tenant"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_mcp_events_usage",
+        "mcp_events",
+        ["occurred_at", "tenant_id", "agent_id", "tool_name"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_mcp_events_usage", table_name="mcp_events")
@@ -3,7 +3,7 @@ from __future__ import annotations
 import uuid
 from datetime import datetime
 
-from sqlalchemy import JSON, Boolean, Date, DateTime, Float, Integer, LargeBinary, String, Text, UniqueConstraint, func
+from sqlalchemy import JSON, Boolean, Date, DateTime, Float, Index, Integer, LargeBinary, String, Text, UniqueConstraint, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -76,6 +76,10 @@ class StrategyRun(Base):
 
 class MCPEvent(Base):
     __tablename__ = "mcp_events"
+    # Covers the time-windowed usage aggregation without touching table rows.
+    __table_args__ = (
+        Index("ix_mcp_events_usage", "occurred_at", "tenant_id", "agent_id", "tool_name"),
+    )
 
     id: Mapped[str] = mapped_column(UUID_TYPE, primary_key=True, default=_uuid_str)
     tenant_id: Mapped[str] = mapped_column(String(36), nullable=False, index=True, default="default")
@@ -3,10 +3,13 @@ from __future__ import annotations
 from datetime import date, datetime, timezone, timedelta
 from typing import Any, Iterable
 
-from sqlalchemy import select, update, func
+from sqlalchemy import insert, select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .models import MCPEvent, Strategy, StrategyRun, Tenant, Wallet
+from .models import MCPEvent, Strategy, StrategyRun, Tenant, Wallet, _uuid_str
+
+# 9 columns per event row keeps one statement under SQLite's 999 bound parameters.
+_EVENT_INSERT_CHUNK = 100
 
 
 class WalletRepository:
@@ -20,6 +23,24 @@ class WalletRepository:
         )
         return list(result.scalars().all())
 
+    async def list_wallet_rows(self) -> list[Any]:
+        """Column-only wallet rows for bulk cache warm-up.
+
+        Skips ORM entity construction and the JSON/timestamp columns, which
+        the in-memory wallet cache never reads.
+        """
+        result = await self.session.execute(
+            select(
+                Wallet.id,
+                Wallet.agent_id,
+                Wallet.address,
+                Wallet.encrypted_privkey,
+                Wallet.chain_id,
+                Wallet.last_nonce,
+            ).where(Wallet.tenant_id == self.tenant_id)
+        )
+        return list(result.all())
+
     async def get_by_agent_id(self, agent_id: str) -> Wallet | None:
         stmt = select(Wallet).where(
             Wallet.agent_id == agent_id, Wallet.tenant_id == self.tenant_id
@@ -66,6 +87,14 @@ class WalletRepository:
         )
         await self.session.execute(stmt)
 
+    async def update_encrypted_privkey(self, agent_id: str, encrypted_privkey: bytes) -> None:
+        stmt = (
+            update(Wallet)
+            .where(Wallet.agent_id == agent_id, Wallet.tenant_id == self.tenant_id)
+            .values(encrypted_privkey=encrypted_privkey)
+        )
+        await self.session.execute(stmt)
+
 
 class StrategyRepository:
     def __init__(self, session: AsyncSession, tenant_id: str) -> None:
@@ -188,6 +217,26 @@ class EventRepository:
          self.session.add(record)
          return record
  
+     async def add_events_bulk(self, events: Iterable[dict[str, Any]]) -> int:
+         """Insert events with multi-row ``INSERT ... VALUES`` statements.
+ 
+         Each dict carries the ``record_event`` keyword fields plus ``occurred_at``.
+         Rows are chunked to stay under SQLite's bound-parameter limit.
+         """
+         rows = [
+             {
+                 "id": _uuid_str(),
+                 "tenant_id": self.tenant_id or "default",
+                 **event,
+             }
+             for event in events
+         ]
+         for start in range(0, len(rows), _EVENT_INSERT_CHUNK):
+             await self.session.execute(
+                 insert(MCPEvent).values(rows[start : start + _EVENT_INSERT_CHUNK])
+             )
+         return len(rows)
+ 
      async def list_events(self, limit: int = 100) -> list[MCPEvent]:
          stmt = select(MCPEvent)
          if self.tenant_id:
@@ -216,14 +265,17 @@ class EventRepository:
          return int(result.scalar_one())
  
      async def aggregate_usage(self, cutoff: datetime) -> list[dict[str, Any]]:
+         # count(*) rather than count(id): every column read here is in
+         # ix_mcp_events_usage, so SQLite answers from the index alone.
+         count = func.count().label("count")
          stmt = select(
              MCPEvent.agent_id,
              MCPEvent.tool_name,
-             func.count(MCPEvent.id).label("count"),
+             count,
          ).where(MCPEvent.occurred_at >= cutoff)
          if self.tenant_id:
              stmt = stmt.where(MCPEvent.tenant_id == self.tenant_id)
-         stmt = stmt.group_by(MCPEvent.agent_id, MCPEvent.tool_name).order_by(func.count(MCPEvent.id).desc())
+         stmt = stmt.group_by(MCPEvent.agent_id, MCPEvent.tool_name).order_by(count.desc())
          result = await self.session.execute(stmt)
          rows: list[dict[str, Any]] = []
          for agent_id, tool_name, count in result:
@@ -236,6 +288,18 @@ class EventRepository:
              )
          return rows
  
+     async def snapshot(
+         self, cutoff: datetime, limit: int = 100
+     ) -> tuple[list[MCPEvent], list[dict[str, Any]]]:
+         """Recent events and per-tool usage since ``cutoff``, read over one connection.
+ 
+         SQLite drivers reject multi-statement execution, so this is two queries;
+         sharing the session saves the second connection checkout.
+         """
+         events = await self.list_events(limit)
+         usage = await self.aggregate_usage(cutoff)
+         return events, usage
+ 
  
 class TenantRepository:
      def __init__(self, session: AsyncSession) -> None:
@@ -1,19 +1,35 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import os
+import time
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
+import structlog
 import yaml
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+try:
+    from watchfiles import awatch  # type: ignore
+except Exception:  # Optional dependency; start_watch falls back to mtime polling
+    awatch = None  # type: ignore
 
+from .core import logger
 from .db.repositories import EventRepository
 
 DEFAULT_POLICY_PATH = "vaultpilot_policy.yml"
 
 
+def _is_transient_db_error(exc: BaseException) -> bool:
+    """Errors worth retrying the same rows for (locked database, dropped connection)."""
+    if isinstance(exc, DBAPIError):
+        return exc.connection_invalidated or isinstance(exc, (OperationalError, InterfaceError))
+    return isinstance(exc, OSError)
+
+
 @dataclass
 class RateLimitRule:
     max_calls: int
@@ -53,6 +69,34 @@ class PolicyConfig:
         return self.tool_overrides.get(tool_name, self.default_rate_limit)
 
 
+class TokenBucketLimiter:
+    """In-process token bucket per (tool, agent).
+
+    Each key holds ``(tokens, last_refill)``; a bucket holds up to
+    ``max_calls`` tokens and refills at ``max_calls / window_seconds`` per
+    second, so checks are O(1) with no history to scan or expire. Limits
+    are per process: workers sharing a database each get the full budget
+    (set ``VAULTPILOT_RATE_LIMIT_SCOPE=database`` for a shared limit).
+    """
+
+    def __init__(self) -> None:
+        self._buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}
+
+    def try_acquire(self, key: Tuple[str, str], rule: RateLimitRule) -> bool:
+        now = time.monotonic()
+        capacity = float(rule.max_calls)
+        tokens, last = self._buckets.get(key, (capacity, now))
+        if rule.window_seconds > 0:
+            tokens = min(capacity, tokens + (now - last) * capacity / rule.window_seconds)
+        else:
+            tokens = capacity
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+
 class PolicyEngine:
     def __init__(
         self,
@@ -65,6 +109,20 @@ class PolicyEngine:
         self._config = config
         self._config_path = config_path
         self._lock = asyncio.Lock()
+        self._limiter = TokenBucketLimiter()
+        # "process" (default): token bucket in memory. "database": count recent
+        # events in the shared database, so every worker enforces one limit.
+        self._rate_limit_scope = os.getenv("VAULTPILOT_RATE_LIMIT_SCOPE", "process").lower()
+        # Audit events are buffered and written in batches (see flush_events)
+        self._pending_events: list[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._event_batch_size = int(os.getenv("VAULTPILOT_EVENT_BATCH_SIZE", "50"))
+        self._event_flush_interval = float(os.getenv("VAULTPILOT_EVENT_FLUSH_MS", "200")) / 1000
+        # Events kept for retry while the database is unavailable; oldest go first
+        self._event_buffer_max = int(os.getenv("VAULTPILOT_EVENT_BUFFER_MAX", "10000"))
+        self.logger = logger.bind(component="PolicyEngine")
+        self._watch_task: Optional[asyncio.Task] = None
 
     @property
     def config(self) -> PolicyConfig:
@@ -82,13 +140,60 @@ class PolicyEngine:
             self._config = new_config
             return new_config
 
-    async def _count_recent_events(
-        self, tool_name: str, agent_id: Optional[str], window: timedelta
-    ) -> int:
-        cutoff = datetime.now(timezone.utc) - window
-        async with self._session_maker() as session:
-            repo = EventRepository(session)
-            return await repo.count_events_since(tool_name, agent_id, cutoff)
+    def start_watch(self, debounce_ms: int = 500) -> None:
+        """Reload the config in the background whenever the policy file changes.
+
+        Uses ``watchfiles`` (inotify/kqueue) when installed, otherwise polls the
+        file's mtime every ``debounce_ms``. Bursts of edits collapse into one
+        reload; a file that fails to parse keeps the previous config.
+        """
+        if not self._config_path:
+            raise RuntimeError("PolicyEngine was not initialized with a config_path")
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch(debounce_ms / 1000))
+
+    async def stop_watch(self) -> None:
+        task, self._watch_task = self._watch_task, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def _config_signature(self) -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(self._config_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    async def _watch(self, debounce: float) -> None:
+        path = Path(self._config_path).resolve()
+        seen = self._config_signature()
+        if awatch is not None:
+            # Watch the directory so editors that replace the file (or create it later) are seen.
+            async for _ in awatch(
+                path.parent,
+                watch_filter=lambda _change, changed: Path(changed) == path,
+                debounce=int(debounce * 1000),
+            ):
+                seen = await self._reload_if_changed(seen)
+        else:
+            while True:
+                await asyncio.sleep(debounce)
+                if self._config_signature() != seen:
+                    await asyncio.sleep(debounce)  # let the writer finish
+                    seen = await self._reload_if_changed(seen)
+
+    async def _reload_if_changed(self, seen: Optional[tuple[int, int]]) -> Optional[tuple[int, int]]:
+        current = self._config_signature()
+        if current == seen:
+            return seen
+        try:
+            await self.reload()
+            self.logger.info("Policy reloaded", path=self._config_path)
+        except Exception as exc:
+            self.logger.error("Policy reload failed", path=self._config_path, error=str(exc))
+        return current
 
     async def enforce(
         self,
@@ -101,14 +206,34 @@ class PolicyEngine:
         rule = self._config.rule_for(tool_name)
         if rule.max_calls <= 0:
             return
-        async with self._lock:
-            recent = await self._count_recent_events(
-                tool_name, agent_id, timedelta(seconds=rule.window_seconds)
-            )
-            if recent >= rule.max_calls:
-                raise PermissionError(
-                    f"Rate limit exceeded for tool '{tool_name}' (agent={agent_id})"
+        if self._rate_limit_scope == "database":
+            async with self._lock:
+                recent = await self._count_recent_events(
+                    tool_name, agent_id, timedelta(seconds=rule.window_seconds)
                 )
+                allowed = recent < rule.max_calls
+        else:
+            allowed = self._limiter.try_acquire((tool_name, agent_id), rule)
+        if not allowed:
+            raise PermissionError(
+                f"Rate limit exceeded for tool '{tool_name}' (agent={agent_id})"
+            )
+
+    async def _count_recent_events(
+        self, tool_name: str, agent_id: Optional[str], window: timedelta
+    ) -> int:
+        cutoff = datetime.now(timezone.utc) - window
+        # Buffered events are not in the database yet but still count toward the limit.
+        pending = sum(
+            1
+            for event in self._pending_events
+            if event["tool_name"] == tool_name
+            and (agent_id is None or event["agent_id"] == agent_id)
+            and event["occurred_at"] >= cutoff
+        )
+        async with self._session_maker() as session:
+            repo = EventRepository(session)
+            return pending + await repo.count_events_since(tool_name, agent_id, cutoff)
 
     async def record_event(
         self,
@@ -120,17 +245,97 @@ class PolicyEngine:
         response_payload: Dict[str, Any] | None,
         error_message: str | None = None,
     ) -> None:
+        self._pending_events.append(
+            {
+                "tool_name": tool_name,
+                "agent_id": agent_id,
+                "status": status,
+                "request_payload": request_payload,
+                "response_payload": response_payload,
+                "error_message": error_message,
+                "occurred_at": datetime.now(timezone.utc),
+            }
+        )
+        if len(self._pending_events) >= self._event_batch_size:
+            await self._flush_quietly()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self._event_flush_interval)
+        # Past the sleep this task owns swapped-out rows: detach it so a
+        # batch-size flush no longer cancels it mid-write.
+        if self._flush_task is asyncio.current_task():
+            self._flush_task = None
+        await self._flush_quietly()
+
+    async def _flush_quietly(self) -> None:
+        # Audit writes must never fail the tool call that produced them.
+        try:
+            await self.flush_events()
+        except Exception as exc:
+            self.logger.error("Event flush failed", error=str(exc))
+
+    async def flush_events(self) -> int:
+        """Write buffered events in one transaction; returns the number written.
+
+        Transient database errors put the rows back (up to
+        ``VAULTPILOT_EVENT_BUFFER_MAX``) and re-raise. Any other failure
+        retries the rows one at a time and drops, with an error log, those
+        that still cannot be written, so one bad row never blocks the buffer.
+        """
+        task = self._flush_task
+        if task is not None:
+            # Only ever a timer still sleeping; writing tasks detach themselves.
+            task.cancel()
+            self._flush_task = None
+        async with self._flush_lock:
+            events, self._pending_events = self._pending_events, []
+            if not events:
+                return 0
+            try:
+                await self._write_events(events)
+            except Exception as exc:
+                if _is_transient_db_error(exc):
+                    self._requeue_events(events)
+                    raise
+                return await self._write_events_singly(events)
+            except BaseException:
+                # Cancellation: the rows go back for the next flush.
+                self._requeue_events(events)
+                raise
+            return len(events)
+
+    async def _write_events(self, events: list[Dict[str, Any]]) -> None:
         async with self._session_maker() as session:
             async with session.begin():
-                repo = EventRepository(session)
-                await repo.record_event(
-                    tool_name=tool_name,
-                    agent_id=agent_id,
-                    status=status,
-                    request_payload=request_payload,
-                    response_payload=response_payload,
-                    error_message=error_message,
+                await EventRepository(session).add_events_bulk(events)
+
+    async def _write_events_singly(self, events: list[Dict[str, Any]]) -> int:
+        written = 0
+        for i, event in enumerate(events):
+            try:
+                await self._write_events([event])
+            except Exception as exc:
+                if _is_transient_db_error(exc):
+                    self._requeue_events(events[i:])
+                    raise
+                self.logger.error(
+                    "Dropping unwritable audit event",
+                    tool_name=event["tool_name"],
+                    event_agent_id=event["agent_id"],
+                    error=str(exc),
                 )
+            else:
+                written += 1
+        return written
+
+    def _requeue_events(self, events: list[Dict[str, Any]]) -> None:
+        self._pending_events[:0] = events
+        overflow = len(self._pending_events) - self._event_buffer_max
+        if overflow > 0:
+            del self._pending_events[:overflow]
+            self.logger.error("Audit event buffer full; dropped oldest events", dropped=overflow)
 
 
 def extract_agent_id(kwargs: Dict[str, Any]) -> Optional[str]:
@@ -148,27 +353,33 @@ async def run_with_policy(
     request_payload: Dict[str, Any] | None,
     call: Callable[[], Any],
 ) -> Any:
-    await engine.enforce(tool_name=tool_name, agent_id=agent_id)
+    # Bound once per call: every log line emitted underneath (wallet, web3,
+    # repositories) carries the tool and agent without threading them through.
+    log_tokens = structlog.contextvars.bind_contextvars(tool=tool_name, agent_id=agent_id)
     try:
-        result = await call()
-        response = result
-        if isinstance(result, (str, bytes)):
-            response = {"result": result if isinstance(result, str) else result.decode()}
-        await engine.record_event(
-            tool_name=tool_name,
-            agent_id=agent_id,
-            status="ok",
-            request_payload=request_payload,
-            response_payload=response,
-        )
-        return result
-    except Exception as exc:  # pragma: no cover - re-raised for tests
-        await engine.record_event(
-            tool_name=tool_name,
-            agent_id=agent_id,
-            status="error",
-            request_payload=request_payload,
-            response_payload=None,
-            error_message=str(exc),
-        )
-        raise
+        await engine.enforce(tool_name=tool_name, agent_id=agent_id)
+        try:
+            result = await call()
+            response = result
+            if isinstance(result, (str, bytes)):
+                response = {"result": result if isinstance(result, str) else result.decode()}
+            await engine.record_event(
+                tool_name=tool_name,
+                agent_id=agent_id,
+                status="ok",
+                request_payload=request_payload,
+                response_payload=response,
+            )
+            return result
+        except Exception as exc:  # pragma: no cover - re-raised for tests
+            await engine.record_event(
+                tool_name=tool_name,
+                agent_id=agent_id,
+                status="error",
+                request_payload=request_payload,
+                response_payload=None,
+                error_message=str(exc),
+            )
+            raise
+    finally:
+        structlog.contextvars.reset_contextvars(**log_tokens)
@@ -0,0 +1,93 @@
+"""Embedding-based redundancy scoring for semantic context trimming.
+
+Requires the optional ``semantic`` extra (sentence-transformers + faiss-cpu);
+both are imported lazily so recency-only deployments never load torch.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Neighbours (including the message itself) used to score redundancy
+_NEIGHBOURS = 6
+
+
+@lru_cache(maxsize=2)
+def load_embedder(model_name: str) -> Optional[Any]:
+    """The sentence-transformers model, or None if the extra is not installed."""
+    try:
+        import faiss  # type: ignore  # noqa: F401
+        from sentence_transformers import SentenceTransformer  # type: ignore
+    except Exception:
+        return None
+    return SentenceTransformer(model_name)
+
+
+def content_key(content: str) -> bytes:
+    return hashlib.sha256(content.encode("utf-8")).digest()
+
+
+def embed(embedder: Any, contents: Sequence[str], cache: Dict[bytes, Any]) -> Any:
+    """Unit-normalised float32 matrix for ``contents``; only unseen texts are encoded.
+
+    ``cache`` maps ``content_key`` to float16 vectors, half the memory of the
+    float32 the index needs.
+    """
+    import numpy as np  # type: ignore
+
+    keys = [content_key(c) for c in contents]
+    missing = [i for i, key in enumerate(keys) if key not in cache]
+    if missing:
+        vectors = embedder.encode(
+            [contents[i] for i in missing],
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        for i, vector in zip(missing, vectors):
+            cache[keys[i]] = vector.astype(np.float16)
+    return np.stack([cache[key] for key in keys]).astype(np.float32)
+
+
+def redundant_indices(vectors: Any, token_counts: Sequence[int], excess: float) -> List[int]:
+    """Indices to drop, most redundant first, until ``excess`` tokens are freed.
+
+    A message's redundancy is its mean cosine similarity to its nearest
+    neighbours (inner product over unit vectors in a ``faiss.IndexFlatIP``),
+    so near-duplicates go before messages carrying unique content. The newest
+    message is never selected.
+    """
+    import faiss  # type: ignore
+
+    n = len(token_counts)
+    if n < 2 or excess <= 0:
+        return []
+    index = faiss.IndexFlatIP(vectors.shape[1])
+    index.add(vectors)
+    k = min(_NEIGHBOURS, n)
+    sims, _ = index.search(vectors, k)
+    # Column 0 is the message matching itself (similarity 1).
+    scores = (sims.sum(axis=1) - 1.0) / (k - 1)
+    order = sorted(range(n - 1), key=lambda i: scores[i], reverse=True)
+    dropped: List[int] = []
+    freed = 0
+    for i in order:
+        if freed >= excess:
+            break
+        dropped.append(i)
+        freed += token_counts[i]
+    return dropped
+
+
+def select_redundant(
+    embedder: Any,
+    contents: Sequence[str],
+    token_counts: Sequence[int],
+    excess: float,
+    cache: Dict[bytes, Any],
+) -> List[int]:
+    """Embed ``contents`` and pick messages to drop; blocking, run it off the event loop."""
+    return redundant_indices(embed(embedder, contents, cache), token_counts, excess)
@@ -7,7 +7,7 @@ from dotenv import load_dotenv
 
 from .core import ContextManager, logger
 from .adapters.web3_adapter import Web3Adapter
-from .wallet import AgentWalletManager
+from .wallet import PRIVATE_NAMESPACES, WALLETS_NS, AgentWalletManager
 from .strategies import dca_once as _dca_once
 from .strategies import send_when_gas_below as _send_when_gas_below
 from .strategies import scheduled_send_once as _scheduled_send_once
@@ -27,7 +27,7 @@ from .db.repositories import EventRepository
 load_dotenv()
 
 try:
-    from mcp.server.fastmcp import FastMCP
+    from mcp.server.fastmcp import Context, FastMCP
     mcp_available = True
 except ImportError:  # Provide lightweight stubs so tests can import without MCP SDK
     class _ServerStub:
@@ -60,6 +60,7 @@ except ImportError:  # Provide lightweight stubs so tests can import without MCP
         async def run_stdio_async(self):
             raise RuntimeError("MCP SDK not installed: 'mcp' package missing")
     FastMCP = _ServerStub  # type: ignore
+    Context = Any  # type: ignore
     mcp_available = False
 
 
@@ -147,10 +148,16 @@ async def execute_transfer(agent_id: str, to_address: str, amount_eth: float, co
 
 
 @server.tool()
-async def generate_response(user_message: str) -> str:
+async def generate_response(user_message: str, stream: bool = False, ctx: Context = None) -> str:
+    """Reply to ``user_message`` with the configured LLM.
+
+    With ``stream`` each fragment is also sent to the client as a log
+    notification while the reply is generated.
+    """
     if _context_mgr is None:
         raise RuntimeError("Server not initialized")
-    return await _context_mgr.generate_response(user_message)
+    on_delta = ctx.info if stream and ctx is not None else None
+    return await _context_mgr.generate_response(user_message, on_delta=on_delta)
 
 
 @server.tool()
@@ -587,19 +594,21 @@ async def generate_dashboard_page() -> str:
     # Build wallet summaries with balances when possible
     wallets = []
     wallet_map = await _wallet_mgr.list_wallets()
+    balances = await _wallet_mgr.query_balances(wallet_map)
     for aid, address in wallet_map.items():
-        try:
-            bal = await _wallet_mgr.query_balance(aid)
-        except Exception:
-            bal = "?"
-        wallets.append({"agent_id": aid, "address": address, "balance_eth": bal})
+        bal = balances.get(aid)
+        wallets.append(
+            {"agent_id": aid, "address": address, "balance_eth": "?" if bal is None else bal}
+        )
     strategies = await _strategy_mgr.list_strategies()
     events: list[dict[str, Any]] = []
     usage: list[dict[str, Any]] = []
     if _policy_engine is not None:
         async with _policy_engine.session_maker() as session:
             repo = EventRepository(session)
-            records = await repo.list_events(50)
+            records, usage = await repo.snapshot(
+                datetime.now(timezone.utc) - timedelta(hours=24), 50
+            )
             events = [
                 {
                     "tool_name": rec.tool_name,
@@ -609,7 +618,6 @@ async def generate_dashboard_page() -> str:
                 }
                 for rec in records
             ]
-            usage = await repo.aggregate_usage(datetime.now(timezone.utc) - timedelta(hours=24))
     return dashboard_html(wallets, strategies, events, usage)
 
 
@@ -649,24 +657,34 @@ async def main() -> None:
             _context_mgr.register_adapter("openai", ollama_adapter)
         except Exception:
             class _NullLLM:
-                async def call(self, context):
-                    return "LLM not configured; set OPENAI_API_KEY or run Ollama locally."
+                async def call(self, context, *, on_delta=None):
+                    reply = "LLM not configured; set OPENAI_API_KEY or run Ollama locally."
+                    if on_delta is not None:
+                        await on_delta(reply)
+                    return reply
             _context_mgr.register_adapter("openai", _NullLLM())
 
     web3_adapter = Web3Adapter(rpc_url)
     _context_mgr.register_adapter("web3", web3_adapter)
     _wallet_mgr = AgentWalletManager(_context_mgr, web3_adapter, encrypt_key, database_url=database_url)
+    await _wallet_mgr.preload_wallets()
     _strategy_mgr = StrategyManager(_wallet_mgr)
     _policy_engine = PolicyEngine(
         _wallet_mgr.session_maker, policy_config, config_path=policy_path
     )
+    _policy_engine.start_watch()
 
     logger.info("AgentVault MCP server starting")
     if not mcp_available:
         raise RuntimeError("MCP SDK not installed: 'mcp' package missing")
 
     # Use FastMCP stdio transport
-    await server.run_stdio_async()
+    try:
+        await server.run_stdio_async()
+    finally:
+        await _policy_engine.stop_watch()
+        await _policy_engine.flush_events()
+        await web3_adapter.aclose()
 
 
 def cli() -> None:
@@ -682,21 +700,21 @@ async def wallet_status(agent_id: str) -> list:
         try:
             bal = await _wallet_mgr.query_balance(agent_id)
             state = _context_mgr.schema.state if _context_mgr else {}
-            addr = state.get(f"{agent_id}_wallet", {}).get("address", "<none>")
+            addr = state.get(WALLETS_NS, {}).get(agent_id, {}).get("address", "<none>")
             content = f"Agent {agent_id}: address={addr}, balance={bal} ETH"
         except Exception as e:
             content = f"Error fetching status for {agent_id}: {e}"
 
     return [{"role": "user", "content": {"type": "text", "text": content}}]
 
+
+_CONTEXT_RESOURCE_EXCLUDE = {"state": {ns: True for ns in PRIVATE_NAMESPACES}}
+
+
 @server.resource("agentvault://context")
 async def agentvault_context() -> str:
     """Expose a sanitized snapshot of context state."""
     if _context_mgr is None:
         return "{}"
-    s = _context_mgr.schema.model_dump()
-    state = s.get("state", {})
-    safe_state = {k: v for k, v in state.items() if not (k.endswith("_wallet") or k.endswith("_balance"))}
-    s["state"] = safe_state
-    import json as _json
-    return _json.dumps(s)
+    # Serialised in one pass by pydantic-core, skipping the per-agent namespaces.
+    return _context_mgr.schema.model_dump_json(exclude=_CONTEXT_RESOURCE_EXCLUDE)
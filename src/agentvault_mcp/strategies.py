@@ -125,7 +125,7 @@ async def micro_tip_equal(
     dry_run: bool = False,
     confirmation_code: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Equal-split micro-tip across recipients in sequence."""
+    """Equal-split micro-tip across recipients as one batched send."""
     if not recipients:
         return {"action": "abort", "reason": "no_recipients"}
     per = total_amount_eth / len(recipients)
@@ -142,12 +142,9 @@ async def micro_tip_equal(
     }
     if dry_run:
         return {"action": "simulation", "summary": summary}
-    tx_hashes: list[str] = []
-    for addr in recipients:
-        tx = await wallet.execute_transfer(
-            agent_id, addr, per, confirmation_code
-        )
-        tx_hashes.append(tx)
+    tx_hashes = await wallet.execute_transfer_batch(
+        agent_id, [(addr, per) for addr in recipients], confirmation_code, await_receipt=False
+    )
     return {"action": "sent", "tx_hashes": tx_hashes, "summary": summary}
 
 async def micro_tip_amounts(
@@ -175,10 +172,7 @@ async def micro_tip_amounts(
     }
     if dry_run:
         return {"action": "simulation", "summary": summary}
-    tx_hashes: list[str] = []
-    for addr, amt in items.items():
-        tx = await wallet.execute_transfer(
-            agent_id, addr, amt, confirmation_code
-        )
-        tx_hashes.append(tx)
+    tx_hashes = await wallet.execute_transfer_batch(
+        agent_id, list(items.items()), confirmation_code, await_receipt=False
+    )
     return {"action": "sent", "tx_hashes": tx_hashes, "summary": summary}
@@ -1,24 +1,45 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import os
-from typing import Any, Dict
+import sys
+import time
+from array import array
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator
 
-from cryptography.fernet import Fernet, InvalidToken
+from cryptography.fernet import InvalidToken
 from eth_account import Account
 from eth_account.hdaccount import generate_mnemonic
-from eth_account.messages import encode_defunct, encode_typed_data
-from pydantic import BaseModel
+from eth_account.messages import SignableMessage, encode_defunct, encode_typed_data
+from eth_account.signers.local import LocalAccount
 from web3 import Web3
 from web3.exceptions import InvalidTransaction
 
 from . import WalletError
 from .core import ContextManager, logger
 from .adapters.web3_adapter import Web3Adapter
+from .crypto import KeyCipher
 from .db.cli import upgrade
 from .db.engine import get_session_maker
 from .db.repositories import WalletRepository
 
+# Context state namespaces: state["wallets"][agent_id], state["balances"][agent_id],
+# state["receipts"][agent_id][tx_hash] -> "success" | "failed" | "unknown"
+WALLETS_NS = "wallets"
+BALANCES_NS = "balances"
+RECEIPTS_NS = "receipts"
+# Settled receipt statuses kept per agent; the oldest are dropped first
+_RECEIPTS_PER_AGENT = 64
+# Per-agent namespaces kept out of the public agentvault://context snapshot
+PRIVATE_NAMESPACES = (WALLETS_NS, BALANCES_NS, RECEIPTS_NS)
+
+_HEX_DIGITS = b"0123456789abcdefABCDEF"
+_HEX_LOWER = b"0123456789abcdef"
+_HEX_UPPER = b"0123456789ABCDEF"
+
 _ERC20_METADATA_ABI = [
     {
         "constant": True,
@@ -44,13 +65,193 @@ _ERC20_METADATA_ABI = [
 ]
 
 
-class WalletState(BaseModel):
+@dataclass(slots=True)
+class WalletState:
     wallet_id: str
     address: str
     encrypted_privkey: bytes
     chain_id: int
     last_nonce: int | None = None
 
+    def to_safe_dict(self) -> Dict[str, Any]:
+        """Public view of the wallet for context state (no key material)."""
+        return {"address": self.address, "chain_id": self.chain_id}
+
+
+_NO_NONCE = -1
+
+
+class WalletStore:
+    """Column-oriented in-memory wallet cache.
+
+    Rows live in parallel columns indexed through ``idx`` so bulk scans
+    (address de-duplication, listing) walk contiguous lists/arrays instead of
+    one object per agent. ``store[agent_id]`` materialises a ``WalletState``
+    snapshot; nonce updates go through :meth:`set_last_nonce`.
+    """
+
+    __slots__ = (
+        "agent_ids",
+        "wallet_ids",
+        "addresses",
+        "enc_keys",
+        "chain_ids",
+        "last_nonces",
+        "idx",
+        "_order",
+        "_address_refs",
+    )
+
+    def __init__(self) -> None:
+        self.agent_ids: list[str] = []
+        self.wallet_ids: list[str] = []
+        self.addresses: list[str] = []
+        self.enc_keys: list[bytes] = []
+        self.chain_ids = array("q")
+        self.last_nonces = array("q")
+        self.idx: dict[str, int] = {}
+        self._order: list[int] | None = None
+        # address -> number of rows holding it, for O(1) membership checks
+        self._address_refs: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.agent_ids)
+
+    def __contains__(self, agent_id: object) -> bool:
+        return agent_id in self.idx
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.agent_ids)
+
+    def __getitem__(self, agent_id: str) -> WalletState:
+        i = self.idx[agent_id]
+        nonce = self.last_nonces[i]
+        return WalletState(
+            wallet_id=self.wallet_ids[i],
+            address=self.addresses[i],
+            encrypted_privkey=self.enc_keys[i],
+            chain_id=self.chain_ids[i],
+            last_nonce=None if nonce == _NO_NONCE else nonce,
+        )
+
+    def put(self, agent_id: str, state: WalletState) -> None:
+        nonce = _NO_NONCE if state.last_nonce is None else state.last_nonce
+        i = self.idx.get(agent_id)
+        if i is None:
+            agent_id = sys.intern(agent_id)
+            self._order = None
+            self.idx[agent_id] = len(self.agent_ids)
+            self.agent_ids.append(agent_id)
+            self.wallet_ids.append(state.wallet_id)
+            self.addresses.append(state.address)
+            self._ref_address(state.address, 1)
+            self.enc_keys.append(state.encrypted_privkey)
+            self.chain_ids.append(state.chain_id)
+            self.last_nonces.append(nonce)
+            return
+        self.wallet_ids[i] = state.wallet_id
+        self._ref_address(self.addresses[i], -1)
+        self._ref_address(state.address, 1)
+        self.addresses[i] = state.address
+        self.enc_keys[i] = state.encrypted_privkey
+        self.chain_ids[i] = state.chain_id
+        self.last_nonces[i] = nonce
+
+    def _ref_address(self, address: str, delta: int) -> None:
+        refs = self._address_refs.get(address, 0) + delta
+        if refs:
+            self._address_refs[address] = refs
+        else:
+            del self._address_refs[address]
+
+    def has_address(self, address: str) -> bool:
+        return address in self._address_refs
+
+    def address(self, agent_id: str) -> str:
+        """Address column lookup, without materialising a ``WalletState``."""
+        return self.addresses[self.idx[agent_id]]
+
+    def next_nonce(self, agent_id: str, node_nonce: int) -> int:
+        """Nonce for the next transaction: the node's pending count, or the one
+        after our last broadcast if the node has not seen that yet."""
+        i = self.idx.get(agent_id)
+        return node_nonce if i is None else max(node_nonce, self.last_nonces[i])
+
+    def set_last_nonce(self, agent_id: str, nonce: int) -> None:
+        self.last_nonces[self.idx[agent_id]] = nonce
+
+    def sorted_addresses(self) -> dict[str, str]:
+        """``agent_id -> address`` ordered by agent id; the order is rebuilt only on insert."""
+        if self._order is None:
+            self._order = sorted(range(len(self.agent_ids)), key=self.agent_ids.__getitem__)
+        return {self.agent_ids[i]: self.addresses[i] for i in self._order}
+
+    def clear(self) -> None:
+        self.agent_ids.clear()
+        self.wallet_ids.clear()
+        self.addresses.clear()
+        self.enc_keys.clear()
+        del self.chain_ids[:]
+        del self.last_nonces[:]
+        self.idx.clear()
+        self._order = None
+        self._address_refs.clear()
+
+
+def _state_from_record(record: Any) -> WalletState:
+    return WalletState(
+        wallet_id=record.id,
+        address=record.address,
+        encrypted_privkey=record.encrypted_privkey,
+        chain_id=record.chain_id,
+        last_nonce=record.last_nonce,
+    )
+
+
+def _hex_address_body(address: str) -> bytes | None:
+    """The 40 hex digits of ``address`` as ASCII bytes, or None if it is not ``0x`` + 40 hex."""
+    if len(address) != 42 or address[:2] != "0x" or not address.isascii():
+        return None
+    body = address[2:].encode("ascii")
+    # bytes.translate with a delete set is a single C pass; any leftover byte is non-hex.
+    return None if body.translate(None, _HEX_DIGITS) else body
+
+
+@lru_cache(maxsize=4096)
+def _is_checksum_address(address: str) -> bool:
+    # EIP-55 verification hashes the address with keccak; recipients repeat.
+    return Web3.is_checksum_address(address)
+
+
+@lru_cache(maxsize=16)
+def _eip1559_template(chain_id: int) -> Dict[str, Any]:
+    """Per-chain fields shared by every transfer; shared, so copy before filling in."""
+    return {"chainId": chain_id, "type": 2}
+
+
+def _derive_account(encryptor: KeyCipher, encrypted_privkey: bytes, agent_id: str) -> LocalAccount:
+    """Decrypt and derive the signing account; CPU-bound, run via ``asyncio.to_thread``."""
+    return Account.from_key(encryptor.decrypt(encrypted_privkey, agent_id))
+
+
+@lru_cache(maxsize=256)
+def _encode_typed_data_json(payload: str) -> SignableMessage:
+    return encode_typed_data(full_message=json.loads(payload))
+
+
+def _encode_typed_data(typed_data: Dict[str, Any]) -> SignableMessage:
+    """EIP-712 encode ``typed_data``, memoised on its canonical JSON form.
+
+    Signing and then verifying the same payload, or re-signing a repeated
+    one, skips re-hashing the type graph and domain. Payloads that are not
+    JSON-serialisable (e.g. raw bytes values) are encoded uncached.
+    """
+    try:
+        payload = json.dumps(typed_data, sort_keys=True)
+    except TypeError:
+        return encode_typed_data(full_message=typed_data)
+    return _encode_typed_data_json(payload)
+
 
 class AgentWalletManager:
     """Wallet-specific MCP layer: Secure, async wallet ops with context integration."""
@@ -69,14 +270,22 @@ class AgentWalletManager:
         self.context = context_manager
         self.web3 = web3_adapter
         try:
-            self.encryptor = Fernet(encrypt_key.encode())
+            self.encryptor = KeyCipher(encrypt_key.encode())
         except Exception as e:  # pragma: no cover - defensive check
             raise WalletError(
                 "Invalid ENCRYPT_KEY: must be a base64-encoded 32-byte Fernet key"
             ) from e
         self.logger = logger.bind(component="AgentWalletManager")
         self._locks: Dict[str, asyncio.Lock] = {}
-        self.wallets: Dict[str, WalletState] = {}
+        self.wallets = WalletStore()
+        # Short-lived cache of derived accounts so bursts of transfers (micro-tips,
+        # DCA ticks) pay for decryption + key derivation once per agent.
+        self._account_cache: Dict[str, tuple[LocalAccount, float]] = {}
+        self._account_cache_ttl = float(os.getenv("AGENTVAULT_ACCOUNT_CACHE_TTL", "30"))
+        # Max balance RPCs in flight when refreshing many wallets at once
+        self._balance_concurrency = int(os.getenv("AGENTVAULT_BALANCE_CONCURRENCY", "16"))
+        # Background receipt watchers for transfers sent with await_receipt=False
+        self._settle_tasks: set[asyncio.Task] = set()
         self.database_url = database_url
         self.tenant_id = tenant_id
         self.session_maker = get_session_maker(database_url)
@@ -87,6 +296,18 @@ class AgentWalletManager:
                 self.logger.error("Database migration failed", error=str(exc))
                 raise
 
+    def _is_valid_address(self, address: str) -> bool:
+        body = _hex_address_body(address) if isinstance(address, str) else None
+        if body is None:
+            return False
+        if os.getenv("AGENTVAULT_STRICT_ADDR") == "1":
+            return self.web3.is_address(address)
+        # Single-case hex carries no EIP-55 checksum, so the hex check is the
+        # whole check; mixed case must carry a valid checksum.
+        if not body.translate(None, _HEX_LOWER) or not body.translate(None, _HEX_UPPER):
+            return True
+        return _is_checksum_address(address)
+
     def _get_lock(self, address: str) -> asyncio.Lock:
         if address not in self._locks:
             self._locks[address] = asyncio.Lock()
@@ -101,9 +322,8 @@ class AgentWalletManager:
             return record is not None
 
     def _cache_wallet_state(self, agent_id: str, state: WalletState) -> WalletState:
-        self.wallets[agent_id] = state
-        safe_state = state.model_dump(exclude={"encrypted_privkey", "last_nonce", "wallet_id"})
-        self.context.update_state(f"{agent_id}_wallet", safe_state)
+        self.wallets.put(agent_id, state)
+        self.context.update_state(agent_id, state.to_safe_dict(), namespace=WALLETS_NS)
         return state
 
     async def _hydrate_wallet_from_db(self, agent_id: str) -> WalletState:
@@ -112,27 +332,48 @@ class AgentWalletManager:
             record = await repo.get_by_agent_id(agent_id)
             if not record:
                 raise WalletError(f"No wallet for {agent_id}.")
-            state = WalletState(
-                wallet_id=record.id,
-                address=record.address,
-                encrypted_privkey=record.encrypted_privkey,
-                chain_id=record.chain_id,
-                last_nonce=record.last_nonce,
-            )
-            return self._cache_wallet_state(agent_id, state)
+            return self._cache_wallet_state(agent_id, _state_from_record(record))
+
+    @cached_property
+    def _sign_transaction(self) -> Callable[..., Any]:
+        # eth.account is stateless and identical across RPC rotations, so one
+        # attribute walk serves every transfer.
+        return self.web3.w3.eth.account.sign_transaction
 
     async def _get_wallet_state(self, agent_id: str) -> WalletState:
         if agent_id in self.wallets:
             return self.wallets[agent_id]
         return await self._hydrate_wallet_from_db(agent_id)
 
-    async def _load_account(self, agent_id: str) -> Account:
+    async def _get_account(self, agent_id: str) -> LocalAccount:
+        cached = self._account_cache.get(agent_id)
+        if cached is not None and time.monotonic() - cached[1] < self._account_cache_ttl:
+            return cached[0]
         state = await self._get_wallet_state(agent_id)
         try:
-            privkey_bytes = self.encryptor.decrypt(state.encrypted_privkey)
+            account = await asyncio.to_thread(
+                _derive_account, self.encryptor, state.encrypted_privkey, agent_id
+            )
         except InvalidToken as exc:
             raise WalletError("Decryption failed—check encrypt key.") from exc
-        return Account.from_key(privkey_bytes)
+        if account.address != state.address:
+            raise WalletError("Key mismatch—security breach.")
+        if not self.encryptor.is_current(state.encrypted_privkey):
+            await self._reseal_key(agent_id, state, account)
+        if self._account_cache_ttl > 0:
+            self._account_cache[agent_id] = (account, time.monotonic())
+        return account
+
+    async def _reseal_key(self, agent_id: str, state: WalletState, account: LocalAccount) -> None:
+        """Re-encrypt a legacy Fernet key as AES-GCM the first time it is used."""
+        encrypted_privkey = self.encryptor.encrypt(account.key, agent_id)
+        async with self.session_maker() as session:
+            async with session.begin():
+                repo = WalletRepository(session, self.tenant_id)
+                await repo.update_encrypted_privkey(agent_id, encrypted_privkey)
+        state.encrypted_privkey = encrypted_privkey
+        self.wallets.put(agent_id, state)
+        self.logger.info("Wallet key resealed", agent_id=agent_id)
 
     async def _store_wallet(
         self,
@@ -142,7 +383,9 @@ class AgentWalletManager:
         *,
         event: str,
     ) -> str:
-        encrypted_privkey = self.encryptor.encrypt(bytes(account.key))
+        # account.key is HexBytes, a bytes subclass AESGCM accepts as-is.
+        encrypted_privkey = self.encryptor.encrypt(account.key, agent_id)
+        self._account_cache.pop(agent_id, None)
         async with self.session_maker() as session:
             async with session.begin():
                 repo = WalletRepository(session, self.tenant_id)
@@ -160,21 +403,21 @@ class AgentWalletManager:
             encrypted_privkey=encrypted_privkey,
             chain_id=chain_id,
         )
-        self._cache_wallet_state(agent_id, state)
-        await self.context.append_to_history(
-            "system", f"Wallet {event} for {agent_id}: {account.address}"
+        self.wallets.put(agent_id, state)
+        await self.context.commit(
+            {agent_id: state.to_safe_dict()},
+            [("system", f"Wallet {event} for {agent_id}: {account.address}")],
+            namespace=WALLETS_NS,
         )
         self.logger.info("Wallet %s", event, agent_id=agent_id, address=account.address)
         return account.address
 
     async def spin_up_wallet(self, agent_id: str) -> str:
         await self.web3.ensure_connection()
-        existing_addresses = {w.address for w in self.wallets.values()}
         account = Account.create()
-        while account.address in existing_addresses:
+        while self.wallets.has_address(account.address):
             account = Account.create()
-        chain_id = self.web3.w3.eth.chain_id
-        chain_id_value = await chain_id if asyncio.iscoroutine(chain_id) else chain_id
+        chain_id_value = await self.web3.chain_id()
         return await self._store_wallet(agent_id, account, chain_id_value, event="created")
 
     async def import_wallet_from_private_key(
@@ -186,8 +429,7 @@ class AgentWalletManager:
             )
         await self.web3.ensure_connection()
         account = Account.from_key(private_key)
-        chain_id = self.web3.w3.eth.chain_id
-        chain_id_value = await chain_id if asyncio.iscoroutine(chain_id) else chain_id
+        chain_id_value = await self.web3.chain_id()
         return await self._store_wallet(
             agent_id, account, chain_id_value, event="imported_from_private_key"
         )
@@ -207,8 +449,7 @@ class AgentWalletManager:
             )
         await self.web3.ensure_connection()
         account = Account.from_mnemonic(mnemonic, account_path=path, passphrase=passphrase or "")
-        chain_id = self.web3.w3.eth.chain_id
-        chain_id_value = await chain_id if asyncio.iscoroutine(chain_id) else chain_id
+        chain_id_value = await self.web3.chain_id()
         return await self._store_wallet(
             agent_id, account, chain_id_value, event="imported_from_mnemonic"
         )
@@ -225,8 +466,7 @@ class AgentWalletManager:
         except Exception as exc:  # pragma: no cover - depends on eth-account internals
             raise WalletError(f"Failed to decrypt keystore: {exc}") from exc
         await self.web3.ensure_connection()
-        chain_id = self.web3.w3.eth.chain_id
-        chain_id_value = await chain_id if asyncio.iscoroutine(chain_id) else chain_id
+        chain_id_value = await self.web3.chain_id()
         return await self._store_wallet(
             agent_id, account, chain_id_value, event="imported_from_keystore"
         )
@@ -234,18 +474,20 @@ class AgentWalletManager:
     async def generate_mnemonic(self, *, num_words: int = 12, language: str = "english") -> str:
         return generate_mnemonic(num_words=num_words, lang=language)
 
-    async def encrypt_wallet_json(self, agent_id: str, password: str) -> str:
-        state = await self._get_wallet_state(agent_id)
+    async def encrypt_wallet_json(
+        self,
+        agent_id: str,
+        password: str,
+        *,
+        kdf: str | None = None,
+        iterations: int | None = None,
+    ) -> str:
+        account = await self._get_account(agent_id)
         try:
-            privkey = self.encryptor.decrypt(state.encrypted_privkey)
-            keystore = Account.encrypt(privkey, password)
-        except InvalidToken:
-            raise WalletError("Decryption failed—check encrypt key.")
+            keystore = Account.encrypt(account.key, password, kdf=kdf, iterations=iterations)
         except Exception as exc:  # pragma: no cover - depends on eth-account internals
             raise WalletError(f"Failed to encrypt wallet: {exc}") from exc
-        import json as _json
-
-        return _json.dumps(keystore)
+        return json.dumps(keystore)
 
     async def decrypt_wallet_json(self, encrypted_json: str, password: str) -> Dict[str, Any]:
         try:
@@ -256,7 +498,7 @@ class AgentWalletManager:
         return {"address": account.address, "private_key": "0x" + priv_bytes.hex()}
 
     async def sign_message(self, agent_id: str, message: str) -> Dict[str, Any]:
-        account = await self._load_account(agent_id)
+        account = await self._get_account(agent_id)
         signable = encode_defunct(text=message)
         signature = account.sign_message(signable)
         return {
@@ -273,12 +515,10 @@ class AgentWalletManager:
         }
 
     async def sign_typed_data(self, agent_id: str, typed_data: Dict[str, Any]) -> Dict[str, Any]:
-        account = await self._load_account(agent_id)
+        account = await self._get_account(agent_id)
         if isinstance(typed_data, str):
-            import json as _json
-
-            typed_data = _json.loads(typed_data)
-        signable = encode_typed_data(full_message=typed_data)
+            typed_data = json.loads(typed_data)
+        signable = _encode_typed_data(typed_data)
         signature = account.sign_message(signable)
         return {
             "signature": signature.signature.hex(),
@@ -289,85 +529,139 @@ class AgentWalletManager:
         self, address: str, typed_data: Dict[str, Any], signature: str
     ) -> Dict[str, Any]:
         if isinstance(typed_data, str):
-            import json as _json
-
-            typed_data = _json.loads(typed_data)
-        signable = encode_typed_data(full_message=typed_data)
+            typed_data = json.loads(typed_data)
+        signable = _encode_typed_data(typed_data)
         recovered = Account.recover_message(signable, signature=signature)
         return {
             "valid": recovered.lower() == address.lower(),
             "recovered_address": recovered,
         }
 
-    async def query_balance(self, agent_id: str) -> float:
+    async def query_balance_wei(self, agent_id: str) -> int:
+        """Raw balance in wei, without touching context state or history."""
         state = await self._get_wallet_state(agent_id)
         await self.web3.ensure_connection()
-        balance_wei = await self.web3.get_balance(state.address)
+        return int(await self.web3.get_balance(state.address))
+
+    async def query_balance(self, agent_id: str) -> float:
+        balance_wei = await self.query_balance_wei(agent_id)
         balance_eth = self.web3.from_wei(balance_wei, "ether")
-        self.context.update_state(f"{agent_id}_balance", float(balance_eth))
-        await self.context.append_to_history(
-            "system", f"Balance for {agent_id}: {balance_eth} ETH"
+        await self.context.commit(
+            {agent_id: float(balance_eth)},
+            [("system", f"Balance for {agent_id}: {balance_eth} ETH")],
+            namespace=BALANCES_NS,
         )
         self.logger.info("Balance queried", agent_id=agent_id, balance=balance_eth)
         return float(balance_eth)
 
+    async def query_balances(self, agent_ids: Iterable[str]) -> dict[str, float | None]:
+        """Balances for several agents, fetched concurrently; None where a query failed.
+
+        At most ``AGENTVAULT_BALANCE_CONCURRENCY`` requests are in flight, and
+        the results land in context state with a single commit.
+        """
+        agent_ids = list(agent_ids)
+        sem = asyncio.Semaphore(max(1, self._balance_concurrency))
+        wallets = self.wallets
+        try:
+            # Check once up front rather than once per agent.
+            await self.web3.ensure_connection()
+        except Exception as exc:
+            self.logger.warning("Balance query failed", error=str(exc))
+            return {agent_id: None for agent_id in agent_ids}
+
+        async def _one(agent_id: str) -> int:
+            async with sem:
+                if agent_id in wallets:
+                    return int(await self.web3.get_balance(wallets.address(agent_id)))
+                return await self.query_balance_wei(agent_id)
+
+        results = await asyncio.gather(*(_one(aid) for aid in agent_ids), return_exceptions=True)
+        balances: dict[str, float | None] = {}
+        for agent_id, result in zip(agent_ids, results):
+            if isinstance(result, BaseException):
+                self.logger.warning("Balance query failed", agent_id=agent_id, error=str(result))
+                balances[agent_id] = None
+            else:
+                balances[agent_id] = float(self.web3.from_wei(result, "ether"))
+        fetched = {aid: bal for aid, bal in balances.items() if bal is not None}
+        if fetched:
+            await self.context.commit(
+                fetched,
+                [("system", f"Balances refreshed for {len(fetched)} agents")],
+                namespace=BALANCES_NS,
+            )
+        return balances
+
     async def execute_transfer(
         self,
         agent_id: str,
         to_address: str,
         amount_eth: float,
         confirmation_code: str | None = None,
+        *,
+        await_receipt: bool = True,
     ) -> str:
+        """Sign and broadcast a transfer, returning its hash.
+
+        With ``await_receipt=False`` the hash is returned right after broadcast
+        and the receipt is recorded in the background (see ``RECEIPTS_NS``).
+        """
         state = await self._get_wallet_state(agent_id)
         try:
-            privkey_bytes = self.encryptor.decrypt(state.encrypted_privkey)
-            account = Account.from_key(privkey_bytes)
-            if account.address != state.address:
-                raise WalletError("Key mismatch—security breach.")
-            if amount_eth <= 0:
-                raise WalletError("Amount must be positive.")
-            if not self.web3.is_address(to_address):
+            value_wei = self._amount_to_wei(amount_eth)
+            if not self._is_valid_address(to_address):
                 raise WalletError("Invalid recipient address.")
             self._enforce_spend_limit(amount_eth, confirmation_code)
+            account = await self._get_account(agent_id)
             async with self._get_lock(state.address):
-                nonce = await self.web3.get_nonce(state.address)
-                priority_fee = await self.web3.max_priority_fee()
-                latest_block = await self.web3.get_block_latest()
+                (
+                    nonce,
+                    priority_fee,
+                    latest_block,
+                    gas_estimate,
+                    bal_wei,
+                ) = await self.web3.batch_transfer_context(
+                    state.address,
+                    {"from": state.address, "to": to_address, "value": value_wei},
+                )
+                nonce = self.wallets.next_nonce(agent_id, nonce)
                 base_fee = latest_block.get("baseFeePerGas") or 0
                 max_fee = base_fee * 2 + priority_fee
 
-                txn = {
-                    "to": to_address,
-                    "value": self.web3.to_wei(amount_eth, "ether"),
-                    "nonce": nonce,
-                    "chainId": state.chain_id,
-                    "maxFeePerGas": max_fee,
-                    "maxPriorityFeePerGas": priority_fee,
-                    "type": 2,
-                }
-                gas_estimate = await self.web3.estimate_gas({**txn, "from": state.address})
-                bal_wei = await self.web3.get_balance(state.address)
-                total_cost_wei = txn["value"] + gas_estimate * max_fee
+                total_cost_wei = value_wei + gas_estimate * max_fee
                 if bal_wei < total_cost_wei:
                     raise WalletError("Insufficient funds for amount + fees.")
-                txn["gas"] = gas_estimate
+                txn = dict(
+                    _eip1559_template(state.chain_id),
+                    to=to_address,
+                    value=value_wei,
+                    nonce=nonce,
+                    maxFeePerGas=max_fee,
+                    maxPriorityFeePerGas=priority_fee,
+                    gas=gas_estimate,
+                )
 
-                signed_txn = self.web3.w3.eth.account.sign_transaction(txn, privkey_bytes)
+                signed_txn = await asyncio.to_thread(self._sign_transaction, txn, account.key)
                 tx_hash = await self.web3.send_raw_transaction(signed_txn.rawTransaction)
-                state.last_nonce = nonce + 1
+                self.wallets.set_last_nonce(agent_id, nonce + 1)
 
-            receipt = await self.web3.wait_for_receipt(tx_hash, timeout=120)
-            if receipt.status != 1:
-                raise WalletError("Transaction failed on-chain.")
+            if await_receipt:
+                receipt = await self.web3.wait_for_receipt(tx_hash, timeout=120)
+                if receipt.status != 1:
+                    raise WalletError("Transaction failed on-chain.")
 
             async with self.session_maker() as session:
                 async with session.begin():
                     repo = WalletRepository(session, self.tenant_id)
-                    await repo.update_last_nonce(agent_id, state.last_nonce)
+                    await repo.update_last_nonce(agent_id, nonce + 1)
 
+            if not await_receipt:
+                self._settle_in_background(agent_id, [tx_hash])
             await self.context.append_to_history(
                 "system",
-                f"Transfer executed for {agent_id}: {amount_eth} ETH to {to_address}. Hash: {tx_hash.hex()}",
+                f"Transfer {'executed' if await_receipt else 'submitted'} for {agent_id}: "
+                f"{amount_eth} ETH to {to_address}. Hash: {tx_hash.hex()}",
             )
             self.logger.info(
                 "Transfer successful", agent_id=agent_id, tx_hash=tx_hash.hex(), amount=amount_eth
@@ -384,33 +678,174 @@ class AgentWalletManager:
             self.logger.error("Transfer failed", error=str(e), agent_id=agent_id)
             raise WalletError(f"Transfer error: {e}")
 
-    async def list_wallets(self) -> dict[str, str]:
+    async def execute_transfer_batch(
+        self,
+        agent_id: str,
+        items: list[tuple[str, float]],
+        confirmation_code: str | None = None,
+        *,
+        await_receipt: bool = True,
+    ) -> list[str]:
+        """Send several transfers from one wallet with a single key derivation.
+
+        Nonces are assigned locally from one lookup and the fee quote is shared
+        across the batch; the signed transactions go out in one JSON-RPC batch
+        and receipts are awaited concurrently (or in the background with
+        ``await_receipt=False``).
+        """
+        if not items:
+            return []
+        state = await self._get_wallet_state(agent_id)
+        try:
+            values_wei = []
+            for to_address, amount_eth in items:
+                values_wei.append(self._amount_to_wei(amount_eth))
+                if not self._is_valid_address(to_address):
+                    raise WalletError("Invalid recipient address.")
+                self._enforce_spend_limit(amount_eth, confirmation_code)
+            account = await self._get_account(agent_id)
+            async with self._get_lock(state.address):
+                first_to, _ = items[0]
+                (
+                    nonce,
+                    priority_fee,
+                    latest_block,
+                    first_gas,
+                    bal_wei,
+                ) = await self.web3.batch_transfer_context(
+                    state.address,
+                    {"from": state.address, "to": first_to, "value": values_wei[0]},
+                )
+                nonce = self.wallets.next_nonce(agent_id, nonce)
+                base_fee = latest_block.get("baseFeePerGas") or 0
+                max_fee = base_fee * 2 + priority_fee
+                rest_gas = await asyncio.gather(
+                    *(
+                        self.web3.estimate_gas(
+                            {"from": state.address, "to": to_address, "value": value_wei}
+                        )
+                        for (to_address, _), value_wei in zip(items[1:], values_wei[1:])
+                    )
+                )
+                gas_estimates = [first_gas, *rest_gas]
+                total_cost_wei = sum(values_wei) + sum(gas_estimates) * max_fee
+                if bal_wei < total_cost_wei:
+                    raise WalletError("Insufficient funds for amount + fees.")
+                template = dict(
+                    _eip1559_template(state.chain_id),
+                    maxFeePerGas=max_fee,
+                    maxPriorityFeePerGas=priority_fee,
+                )
+                txns = [
+                    dict(template, to=to_address, value=value_wei, nonce=nonce + i, gas=gas)
+                    for i, ((to_address, _), value_wei, gas) in enumerate(
+                        zip(items, values_wei, gas_estimates)
+                    )
+                ]
+                sign = self._sign_transaction
+                signed_txns = await asyncio.to_thread(
+                    lambda: [sign(txn, account.key) for txn in txns]
+                )
+                tx_hashes = await self.web3.send_raw_transactions(
+                    [signed_txn.rawTransaction for signed_txn in signed_txns]
+                )
+                self.wallets.set_last_nonce(agent_id, nonce + len(tx_hashes))
+
+            if await_receipt:
+                receipts = await asyncio.gather(
+                    *(self.web3.wait_for_receipt(tx_hash, timeout=120) for tx_hash in tx_hashes)
+                )
+                if any(receipt.status != 1 for receipt in receipts):
+                    raise WalletError("Transaction failed on-chain.")
+
+            async with self.session_maker() as session:
+                async with session.begin():
+                    repo = WalletRepository(session, self.tenant_id)
+                    await repo.update_last_nonce(agent_id, nonce + len(tx_hashes))
+
+            if not await_receipt:
+                self._settle_in_background(agent_id, tx_hashes)
+            hashes = [tx_hash.hex() for tx_hash in tx_hashes]
+            await self.context.append_to_history(
+                "system",
+                f"Batch transfer {'executed' if await_receipt else 'submitted'} for {agent_id}: "
+                f"{len(hashes)} transfers. Hashes: {', '.join(hashes)}",
+            )
+            self.logger.info("Batch transfer successful", agent_id=agent_id, count=len(hashes))
+            return hashes
+        except InvalidTransaction as e:
+            self.logger.error("Invalid txn", error=str(e), agent_id=agent_id)
+            raise WalletError(f"Transaction invalid: {e}")
+        except WalletError:
+            raise
+        except Exception as e:
+            self.logger.error("Batch transfer failed", error=str(e), agent_id=agent_id)
+            raise WalletError(f"Transfer error: {e}")
+
+    def _settle_in_background(self, agent_id: str, tx_hashes: list[Any]) -> None:
+        task = asyncio.create_task(self._settle_receipts(agent_id, tx_hashes))
+        self._settle_tasks.add(task)
+        task.add_done_callback(self._settle_tasks.discard)
+
+    async def _settle_receipts(self, agent_id: str, tx_hashes: list[Any]) -> None:
+        receipts = await asyncio.gather(
+            *(self.web3.wait_for_receipt(tx_hash, timeout=120) for tx_hash in tx_hashes),
+            return_exceptions=True,
+        )
+        settled = dict(self.context.schema.state.get(RECEIPTS_NS, {}).get(agent_id, {}))
+        entries = []
+        for tx_hash, receipt in zip(tx_hashes, receipts):
+            tx_hex = tx_hash.hex()
+            if isinstance(receipt, BaseException):
+                status = "unknown"
+                self.logger.warning(
+                    "Receipt wait failed", agent_id=agent_id, tx_hash=tx_hex, error=str(receipt)
+                )
+            else:
+                status = "success" if receipt.status == 1 else "failed"
+            if status == "failed":
+                self.logger.error("Transaction failed on-chain", agent_id=agent_id, tx_hash=tx_hex)
+            settled.pop(tx_hex, None)
+            settled[tx_hex] = status
+            entries.append(("system", f"Receipt for {agent_id}: {tx_hex} {status}"))
+        for stale in list(settled)[: max(0, len(settled) - _RECEIPTS_PER_AGENT)]:
+            del settled[stale]
+        await self.context.commit({agent_id: settled}, entries, namespace=RECEIPTS_NS)
+
+    async def preload_wallets(self) -> dict[str, WalletState]:
+        """Hydrate the wallet cache for the whole tenant with a single query.
+
+        Intended for server start-up so the first call per agent does not pay
+        a database round-trip on the request path.
+        """
         async with self.session_maker() as session:
             repo = WalletRepository(session, self.tenant_id)
-            records = await repo.list_wallets()
-        result: dict[str, str] = {}
+            records = await repo.list_wallet_rows()
+        loaded: dict[str, WalletState] = {}
         for record in records:
-            state = WalletState(
-                wallet_id=record.id,
-                address=record.address,
-                encrypted_privkey=record.encrypted_privkey,
-                chain_id=record.chain_id,
-                last_nonce=record.last_nonce,
+            loaded[record.agent_id] = self._cache_wallet_state(
+                record.agent_id, _state_from_record(record)
             )
-            self._cache_wallet_state(record.agent_id, state)
-            result[record.agent_id] = record.address
-        return result
+        return loaded
 
-    async def export_wallet_keystore(self, agent_id: str, passphrase: str) -> str:
-        state = await self._get_wallet_state(agent_id)
-        try:
-            privkey_bytes = self.encryptor.decrypt(state.encrypted_privkey)
-            keystore_dict = Account.encrypt(privkey_bytes, passphrase)
-            import json as _json
+    async def list_wallets(self) -> dict[str, str]:
+        await self.preload_wallets()
+        return self.wallets.sorted_addresses()
 
-            return _json.dumps(keystore_dict)
-        except InvalidToken:
-            raise WalletError("Decryption failed—check encrypt key.")
+    async def export_wallet_keystore(
+        self,
+        agent_id: str,
+        passphrase: str,
+        *,
+        kdf: str | None = None,
+        iterations: int | None = None,
+    ) -> str:
+        account = await self._get_account(agent_id)
+        try:
+            keystore_dict = Account.encrypt(
+                account.key, passphrase, kdf=kdf, iterations=iterations
+            )
+            return json.dumps(keystore_dict)
         except Exception as e:
             raise WalletError(f"Keystore export failed: {e}")
 
@@ -426,7 +861,7 @@ class AgentWalletManager:
             raise WalletError("Plaintext export requires a valid confirmation code.")
         state = await self._get_wallet_state(agent_id)
         try:
-            privkey_bytes = self.encryptor.decrypt(state.encrypted_privkey)
+            privkey_bytes = self.encryptor.decrypt(state.encrypted_privkey, agent_id)
             return "0x" + privkey_bytes.hex()
         except InvalidToken:
             raise WalletError("Decryption failed—check encrypt key.")
@@ -435,29 +870,22 @@ class AgentWalletManager:
 
     async def simulate_transfer(self, agent_id: str, to_address: str, amount_eth: float) -> dict:
         state = await self._get_wallet_state(agent_id)
-        if amount_eth <= 0:
-            raise WalletError("Amount must be positive.")
-        if not self.web3.is_address(to_address):
+        value_wei = self._amount_to_wei(amount_eth)
+        if not self._is_valid_address(to_address):
             raise WalletError("Invalid recipient address.")
-        priority_fee = await self.web3.max_priority_fee()
-        latest_block = await self.web3.get_block_latest()
+        priority_fee, latest_block, gas_estimate, balance_wei = await asyncio.gather(
+            self.web3.max_priority_fee(),
+            self.web3.get_block_latest(),
+            self.web3.estimate_gas(
+                {"from": state.address, "to": to_address, "value": value_wei}
+            ),
+            self.web3.get_balance(state.address),
+        )
         base_fee = latest_block.get("baseFeePerGas") or 0
         max_fee = base_fee * 2 + priority_fee
-        txn = {
-            "to": to_address,
-            "value": self.web3.to_wei(amount_eth, "ether"),
-            "chainId": state.chain_id,
-            "maxFeePerGas": max_fee,
-            "maxPriorityFeePerGas": priority_fee,
-            "type": 2,
-        }
-        gas_estimate = await self.web3.estimate_gas({**txn, "from": state.address})
         total_fee_wei = gas_estimate * max_fee
         total_fee_eth = float(self.web3.from_wei(total_fee_wei, "ether"))
         total_eth = amount_eth + total_fee_eth
-        balance_eth = float(
-            self.web3.from_wei(await self.web3.get_balance(state.address), "ether")
-        )
         return {
             "from": state.address,
             "to": to_address,
@@ -467,7 +895,7 @@ class AgentWalletManager:
             "max_priority_fee_per_gas": int(priority_fee),
             "estimated_fee_eth": total_fee_eth,
             "estimated_total_eth": total_eth,
-            "insufficient_funds": balance_eth < total_eth,
+            "insufficient_funds": balance_wei < value_wei + total_fee_wei,
         }
 
     async def request_faucet_funds(
@@ -502,6 +930,16 @@ class AgentWalletManager:
         except Exception as e:
             raise WalletError(f"Faucet request failed: {e}")
 
+    def _amount_to_wei(self, amount_eth: float) -> int:
+        """Exact integer wei for a positive ETH amount; rejects amounts under 1 wei."""
+        if amount_eth <= 0:
+            raise WalletError("Amount must be positive.")
+        value_wei = self.web3.to_wei(amount_eth, "ether")
+        if value_wei <= 0:
+            # e.g. 1e-19 passes the check above but would send a zero-value transaction
+            raise WalletError("Amount is below 1 wei.")
+        return value_wei
+
     def _enforce_spend_limit(self, amount_eth: float, confirmation_code: str | None = None) -> None:
         max_tx_env = os.getenv("AGENTVAULT_MAX_TX_ETH")
         if not max_tx_env:
@@ -520,8 +958,7 @@ class AgentWalletManager:
 
     async def provider_status(self) -> Dict[str, Any]:
         await self.web3.ensure_connection()
-        chain_id_val = self.web3.w3.eth.chain_id
-        chain_id = await chain_id_val if asyncio.iscoroutine(chain_id_val) else chain_id_val
+        chain_id = await self.web3.chain_id()
         latest_block = await self.web3.get_block_latest()
         block_number = latest_block.get("number")
         block_time = latest_block.get("timestamp")
@@ -558,15 +995,14 @@ class AgentWalletManager:
             )
         if gas_price_gwei is not None:
             info["estimated_gas_price_gwei"] = gas_price_gwei
-        self.context.update_state("provider_status", info)
-        await self.context.append_to_history(
-            "system",
-            f"Provider status refreshed (chain_id={chain_id}, block={block_number})",
+        await self.context.commit(
+            {"provider_status": info},
+            [("system", f"Provider status refreshed (chain_id={chain_id}, block={block_number})")],
         )
         return info
 
     async def inspect_contract(self, address: str) -> Dict[str, Any]:
-        if not self.web3.is_address(address):
+        if not self._is_valid_address(address):
             raise WalletError("Invalid contract address.")
         checksum = Web3.to_checksum_address(address)
         await self.web3.ensure_connection()
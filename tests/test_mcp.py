@@ -1,3 +1,6 @@
+import asyncio
+from types import SimpleNamespace
+
 import pytest
 from cryptography.fernet import Fernet
 
@@ -13,6 +16,122 @@ async def test_context_trim():
     # After trimming, history should be reduced
     assert len(mgr.schema.history) < 10
 
+@pytest.mark.asyncio
+async def test_context_token_count_tracks_history_incrementally():
+    mgr = ContextManager(max_tokens=40, trim_strategy="recency")
+    mgr.schema.system_prompt = "be brief"
+    for i in range(12):
+        await mgr.append_to_history("user", f"message number {i} " * 3)
+    assert len(mgr._msg_tokens) == len(mgr.schema.history) < 12
+    fresh = ContextManager(max_tokens=40)
+    fresh.schema.system_prompt = mgr.schema.system_prompt
+    fresh.schema.history = list(mgr.schema.history)
+    assert mgr._calculate_tokens() == fresh._calculate_tokens()
+
+@pytest.mark.asyncio
+async def test_chat_messages_follow_appends_and_trims():
+    mgr = ContextManager(max_tokens=40, trim_strategy="recency")
+    mgr.schema.system_prompt = "sys"
+    for i in range(12):
+        await mgr.append_to_history("user", f"message number {i} " * 3)
+        msgs = mgr.schema.chat_messages()
+        assert msgs[0] == {"role": "system", "content": "sys"}
+        assert msgs[1:] == mgr.schema.history
+    mgr.schema.system_prompt = "new"
+    assert mgr.schema.chat_messages()[0]["content"] == "new"
+
+@pytest.mark.asyncio
+async def test_context_trim_compacts_into_summary():
+    class SummaryAdapter:
+        def __init__(self):
+            self.batches = []
+
+        async def summarize(self, messages):
+            self.batches.append(len(messages))
+            return "short"
+
+    adapter = SummaryAdapter()
+    mgr = ContextManager(max_tokens=40, trim_strategy="recency")
+    mgr.compact_history = True
+    mgr.register_adapter("openai", adapter)
+    for i in range(12):
+        await mgr.append_to_history("user", f"message number {i} " * 3)
+    assert adapter.batches
+    summaries = [m for m in mgr.schema.history if m["content"].startswith("[prior context summary]")]
+    assert len(summaries) == 1 and mgr.schema.history[0] is summaries[0]
+    assert mgr.schema.chat_messages()[1:] == mgr.schema.history
+    assert mgr._msg_token_total == sum(mgr._msg_tokens)
+
+@pytest.mark.asyncio
+async def test_compaction_summary_does_not_hold_the_trim_lock():
+    class SlowSummaryAdapter:
+        def __init__(self):
+            self.release = asyncio.Event()
+            self.calls = 0
+
+        async def summarize(self, messages):
+            self.calls += 1
+            await self.release.wait()
+            return "short"
+
+    adapter = SlowSummaryAdapter()
+    mgr = ContextManager(max_tokens=200, trim_strategy="recency")
+    mgr.compact_history = True
+    mgr.register_adapter("openai", adapter)
+    mgr._count_tokens = lambda texts: [10] * len(texts)
+    for i in range(17):
+        await mgr.append_to_history("user", f"m{i}")
+    compacting = asyncio.create_task(mgr.append_to_history("user", "m17"))
+    while not adapter.calls:
+        await asyncio.sleep(0)
+
+    await asyncio.wait_for(mgr.append_to_history("user", "hi"), 1)
+    adapter.release.set()
+    await compacting
+
+    history = mgr.schema.history
+    assert adapter.calls == 1
+    assert history[0]["content"] == "[prior context summary] short"
+    assert [m["content"] for m in history[1:3]] == ["m3", "m4"]
+    assert history[-1]["content"] == "hi"
+    assert mgr._msg_token_total == sum(mgr._msg_tokens)
+
+@pytest.mark.asyncio
+async def test_semantic_trim_falls_back_to_recency_when_embedder_fails(monkeypatch):
+    from agentvault_mcp import semantic
+
+    def _broken(_name):
+        raise OSError("model download failed")
+
+    monkeypatch.setattr(semantic, "load_embedder", _broken)
+    mgr = ContextManager(max_tokens=20, trim_strategy="semantic")
+    for _ in range(10):
+        await mgr.append_to_history("user", "a" * 10)
+    assert len(mgr.schema.history) < 10
+
+@pytest.mark.asyncio
+async def test_context_commit_applies_state_and_history():
+    mgr = ContextManager()
+    await mgr.commit({"a": 1, "b": 2}, [("system", "one"), ("system", "two")])
+    assert mgr.schema.state == {"a": 1, "b": 2}
+    assert [m["content"] for m in mgr.schema.history] == ["one", "two"]
+
+@pytest.mark.asyncio
+async def test_context_resource_hides_private_namespaces(monkeypatch):
+    import json
+
+    from agentvault_mcp import server
+    from agentvault_mcp.wallet import PRIVATE_NAMESPACES
+
+    mgr = ContextManager()
+    for ns in PRIVATE_NAMESPACES:
+        mgr.update_state("agent", {"secret": ns}, namespace=ns)
+    mgr.update_state("mode", "demo")
+    monkeypatch.setattr(server, "_context_mgr", mgr)
+    state = json.loads(await server.agentvault_context())["state"]
+    assert state == {"mode": "demo"}
+    assert "receipts" in PRIVATE_NAMESPACES
+
 @pytest.mark.asyncio
 async def test_wallet_spin_up(tmp_path):
     class DummyEth:
@@ -32,6 +151,8 @@ async def test_wallet_spin_up(tmp_path):
             self.w3 = DummyW3()
         async def ensure_connection(self):
             return True
+        async def chain_id(self):
+            return await self.w3.eth.chain_id
 
     context_mgr = ContextManager()
     web3_adapter = DummyWeb3Adapter()
@@ -40,10 +161,10 @@ async def test_wallet_spin_up(tmp_path):
     wallet_mgr = AgentWalletManager(context_mgr, web3_adapter, encrypt_key, database_url=db_url)
     address = await wallet_mgr.spin_up_wallet("test_agent")
     assert address.startswith("0x")
-    assert "test_agent_wallet" in context_mgr.schema.state
+    assert "test_agent" in context_mgr.schema.state["wallets"]
 
 @pytest.mark.asyncio
-async def test_spend_limit_gate(monkeypatch, tmp_path):
+async def test_spend_limit_gate(monkeypatch, tmp_path, stub_batch_transfer_context):
     class W3Stub:
         def __init__(self) -> None:
             class Eth:
@@ -95,6 +216,9 @@ async def test_spend_limit_gate(monkeypatch, tmp_path):
         async def ensure_connection(self) -> bool:
             return True
 
+        async def chain_id(self) -> int:
+            return self.w3.eth.chain_id
+
         async def get_nonce(self, *_):
             return 0
 
@@ -110,6 +234,8 @@ async def test_spend_limit_gate(monkeypatch, tmp_path):
         async def max_priority_fee(self):
             return 1_000_000_000
 
+        batch_transfer_context = stub_batch_transfer_context
+
         async def send_raw_transaction(self, *_):
             return b""
 
@@ -146,6 +272,7 @@ async def test_keystore_export_roundtrip(tmp_path):
         class _W3: eth = type("E", (), {"chain_id": 11155111})
         w3 = _W3()
         async def ensure_connection(self): return True
+        async def chain_id(self): return self.w3.eth.chain_id
         async def get_block_latest(self):
             return {"baseFeePerGas": 0}
         async def get_nonce(self, *_): return 0
@@ -156,7 +283,7 @@ async def test_keystore_export_roundtrip(tmp_path):
     mgr = AgentWalletManager(ctx, Web3AdapterStub(), key, database_url=db_url)
     aid = "k1"
     await mgr.spin_up_wallet(aid)
-    ks = await mgr.export_wallet_keystore(aid, "pass")
+    ks = await mgr.export_wallet_keystore(aid, "pass", iterations=2)
     assert "\"crypto\"" in ks
 
 
@@ -176,8 +303,69 @@ async def test_generate_response_with_fake_adapter():
     # History should contain both user and assistant messages
     roles = [m["role"] for m in mgr.schema.history]
     assert roles.count("user") == 1 and roles.count("assistant") == 1
-import os
-import sys
 
-# Allow running directly via `python test_mcp.py` without installing pkg
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+
+@pytest.mark.asyncio
+async def test_generate_response_delivers_deltas_from_any_adapter():
+    class StreamingAdapter:
+        async def call(self, context, *, on_delta=None):
+            for part in ("o", "k"):
+                await on_delta(part)
+            return "ok"
+
+    class PlainAdapter:
+        async def call(self, context):
+            return "ok"
+
+    mgr = ContextManager(max_tokens=100, trim_strategy="recency")
+    mgr.register_adapter("streaming", StreamingAdapter())
+    mgr.register_adapter("plain", PlainAdapter())
+    for name, expected in (("streaming", ["o", "k"]), ("plain", ["ok"])):
+        deltas = []
+
+        async def on_delta(delta):
+            deltas.append(delta)
+
+        assert await mgr.generate_response("hi", adapter_name=name, on_delta=on_delta) == "ok"
+        assert deltas == expected
+
+
+@pytest.mark.asyncio
+async def test_openai_adapter_paces_requests_and_tokens(monkeypatch):
+    from agentvault_mcp.adapters import openai_adapter
+
+    clock = [0.0]
+    waits = []
+
+    async def fake_sleep(seconds):
+        waits.append(seconds)
+        clock[0] += seconds
+
+    adapter = openai_adapter.OpenAIAdapter("sk-test", rpm=60, tpm=600)
+    monkeypatch.setattr(openai_adapter, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    monkeypatch.setattr(openai_adapter, "asyncio", SimpleNamespace(sleep=fake_sleep))
+    adapter._last_refill = 0.0
+    adapter._request_capacity = 1
+    adapter._token_capacity = 600
+
+    await adapter._acquire_capacity(100)
+    assert waits == []
+    await adapter._acquire_capacity(100)  # request bucket empty: one call per second
+    assert waits == [1.0]
+    await adapter._acquire_capacity(10_000)  # capped at a full TPM bucket
+    # 410 tokens are left; the missing 190 refill at 10 per second
+    assert waits[1] == pytest.approx(19.0)
+    assert adapter._token_capacity == pytest.approx(0)
+
+
+def test_semantic_trim_drops_near_duplicates_first():
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("faiss")
+    from agentvault_mcp.semantic import redundant_indices
+
+    vectors = np.array(
+        [[1, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 0, 0]], dtype=np.float32
+    )
+    dropped = redundant_indices(vectors, [10] * 5, excess=15)
+    assert len(dropped) == 2
+    assert set(dropped) <= {0, 1}
@@ -1,56 +1,52 @@
 import asyncio
+import json
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
 import pytest
-from cryptography.fernet import Fernet
+import pytest_asyncio
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
 
-from agentvault_mcp.core import ContextManager
-from agentvault_mcp.wallet import AgentWalletManager
-from agentvault_mcp.policy import PolicyConfig, PolicyEngine, RateLimitRule, run_with_policy
+from agentvault_mcp import policy
+from agentvault_mcp.policy import (
+    PolicyConfig,
+    PolicyEngine,
+    RateLimitRule,
+    TokenBucketLimiter,
+    run_with_policy,
+)
+from agentvault_mcp.db.models import Base
 from agentvault_mcp.db.repositories import EventRepository
 
 
-class DummyWeb3:
-    class Eth:
-        chain_id = 11155111
-
-    eth = Eth()
-
-    async def ensure_connection(self):
-        return True
-
-    async def get_nonce(self, *_):
-        return 0
-
-
-class DummyAdapter:
-    def __init__(self):
-        self.w3 = DummyWeb3()
-
-    async def ensure_connection(self):
-        return True
+@pytest_asyncio.fixture
+async def session_maker():
+    # One in-memory connection per test: no database file, fsync or migration run.
+    db = create_async_engine(
+        "sqlite+aiosqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+    )
+    async with db.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(db, expire_on_commit=False, autoflush=False)
+    await db.dispose()
 
 
-def _make_engine(tmp_path):
-    ctx = ContextManager()
-    mgr = AgentWalletManager(
-        ctx,
-        DummyAdapter(),
-        Fernet.generate_key().decode(),
-        database_url=f"sqlite+aiosqlite:///{tmp_path / 'policy.db'}",
-        auto_migrate=True,
-    )
+def _make_engine(session_maker):
     config = PolicyConfig(
         default_rate_limit=RateLimitRule(max_calls=1, window_seconds=60),
         tool_overrides={},
     )
-    engine = PolicyEngine(mgr.session_maker, config)
-    return engine
+    return PolicyEngine(session_maker, config)
 
 
 @pytest.mark.asyncio
-async def test_policy_rate_limit(tmp_path):
-    engine = _make_engine(tmp_path)
+async def test_policy_rate_limit(session_maker):
+    engine = _make_engine(session_maker)
 
     async def call():
         return "ok"
@@ -74,8 +70,46 @@ async def test_policy_rate_limit(tmp_path):
 
 
 @pytest.mark.asyncio
-async def test_policy_event_logging(tmp_path):
-    engine = _make_engine(tmp_path)
+async def test_database_scope_shares_limit_between_engines(session_maker, monkeypatch):
+    monkeypatch.setenv("VAULTPILOT_RATE_LIMIT_SCOPE", "database")
+    first, second = _make_engine(session_maker), _make_engine(session_maker)
+
+    async def call():
+        return "ok"
+
+    await run_with_policy(
+        first, tool_name="test_tool", agent_id="agent", request_payload=None, call=call
+    )
+    await first.flush_events()
+
+    with pytest.raises(PermissionError):
+        await run_with_policy(
+            second, tool_name="test_tool", agent_id="agent", request_payload=None, call=call
+        )
+
+
+def test_token_bucket_refills_continuously(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(policy, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    limiter = TokenBucketLimiter()
+    rule = RateLimitRule(max_calls=2, window_seconds=10)
+
+    assert limiter.try_acquire(("t", "a"), rule)
+    assert limiter.try_acquire(("t", "a"), rule)
+    assert not limiter.try_acquire(("t", "a"), rule)
+    assert limiter.try_acquire(("t", "b"), rule)  # buckets are per key
+
+    clock[0] += 4.9  # 0.98 tokens: still short of one call
+    assert not limiter.try_acquire(("t", "a"), rule)
+    clock[0] += 0.2
+    assert limiter.try_acquire(("t", "a"), rule)
+    clock[0] += 1000  # refill is capped at max_calls
+    assert [limiter.try_acquire(("t", "a"), rule) for _ in range(3)] == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_policy_event_logging(session_maker):
+    engine = _make_engine(session_maker)
 
     async def call():
         raise RuntimeError("fail")
@@ -89,44 +123,138 @@ async def test_policy_event_logging(tmp_path):
             call=call,
         )
 
+    assert await engine.flush_events() == 1
     async with engine.session_maker() as session:
         repo = EventRepository(session)
-        events = await repo.list_events(10)
+        events, usage = await repo.snapshot(datetime.now(timezone.utc) - timedelta(days=1), 10)
 
     assert events
     assert events[0].status == "error"
     assert events[0].error_message == "fail"
-
-    async with engine.session_maker() as session:
-        repo = EventRepository(session)
-        usage = await repo.aggregate_usage(datetime.now(timezone.utc) - timedelta(days=1))
-
     assert usage
     assert usage[0]["count"] >= 1
 
 
+class _SlowSessions:
+    """Session maker whose sessions open only after ``delay`` seconds."""
+
+    def __init__(self, inner, delay):
+        self._inner = inner
+        self._delay = delay
+
+    @asynccontextmanager
+    async def __call__(self):
+        await asyncio.sleep(self._delay)
+        async with self._inner() as session:
+            yield session
+
+
+@pytest.mark.asyncio
+async def test_batch_flush_does_not_drop_rows_of_running_timed_flush(session_maker):
+    engine = _make_engine(_SlowSessions(session_maker, 0.05))
+    engine._event_batch_size = 2
+    engine._event_flush_interval = 0
+
+    async def record(n):
+        await engine.record_event(
+            tool_name="t", agent_id=f"a{n}", status="ok",
+            request_payload=None, response_payload=None,
+        )
+
+    await record(0)
+    await asyncio.sleep(0.01)  # timed flush has taken row 0 and is mid-write
+    await record(1)
+    await record(2)  # batch-size flush while the timed one is still writing
+    await engine.flush_events()
+    await asyncio.sleep(0.1)
+
+    async with session_maker() as session:
+        events, _ = await EventRepository(session).snapshot(
+            datetime.now(timezone.utc) - timedelta(days=1), 10
+        )
+    assert sorted(e.agent_id for e in events) == ["a0", "a1", "a2"]
+
+
 @pytest.mark.asyncio
-async def test_policy_reload(tmp_path, monkeypatch):
+async def test_unwritable_event_is_dropped_without_failing_the_call(session_maker):
+    engine = _make_engine(session_maker)
+    engine._event_batch_size = 2
+
+    async def call():
+        return "sent"
+
+    await engine.record_event(
+        tool_name="t", agent_id="bad", status="ok",
+        request_payload={"obj": object()}, response_payload=None,
+    )
+    # The size-triggered flush fails on the bad row inside the success path.
+    assert await run_with_policy(
+        engine, tool_name="t", agent_id="good", request_payload=None, call=call
+    ) == "sent"
+
+    assert engine._pending_events == []
+    async with session_maker() as session:
+        events, _ = await EventRepository(session).snapshot(
+            datetime.now(timezone.utc) - timedelta(days=1), 10
+        )
+    assert [(e.agent_id, e.status) for e in events] == [("good", "ok")]
+
+
+class _LockedSessions:
+    """Session maker that fails as if the database were locked."""
+
+    @asynccontextmanager
+    async def __call__(self):
+        raise OperationalError("INSERT", None, Exception("database is locked"))
+        yield
+
+
+@pytest.mark.asyncio
+async def test_transient_flush_failure_requeues_up_to_the_buffer_cap():
+    engine = _make_engine(_LockedSessions())
+    engine._event_batch_size = 1
+    engine._event_buffer_max = 3
+
+    for n in range(5):
+        await engine.record_event(
+            tool_name="t", agent_id=f"a{n}", status="ok",
+            request_payload=None, response_payload=None,
+        )
+
+    assert [e["agent_id"] for e in engine._pending_events] == ["a2", "a3", "a4"]
+    with pytest.raises(OperationalError):
+        await engine.flush_events()
+
+
+def test_json_column_serialiser_accepts_uint256_values():
+    pytest.importorskip("orjson")
+    from agentvault_mcp.db.engine import _orjson_dumps
+
+    assert json.loads(_orjson_dumps({"wei": 2**70, 1: "a"})) == {"wei": 2**70, "1": "a"}
+    with pytest.raises(TypeError):
+        _orjson_dumps({"obj": object()})
+
+
+@pytest.mark.asyncio
+async def test_policy_reload(tmp_path, session_maker):
     config_path = tmp_path / "policy.yml"
     config_path.write_text(
         """rate_limits:\n  default:\n    max_calls: 1\n    window_seconds: 60\n"""
     )
-    ctx = ContextManager()
-    mgr = AgentWalletManager(
-        ctx,
-        DummyAdapter(),
-        Fernet.generate_key().decode(),
-        database_url=f"sqlite+aiosqlite:///{tmp_path / 'policy_reload.db'}",
-        auto_migrate=True,
-    )
     config = PolicyConfig.load(config_path)
-    engine = PolicyEngine(mgr.session_maker, config, config_path=str(config_path))
+    engine = PolicyEngine(session_maker, config, config_path=str(config_path))
     assert engine.config.default_rate_limit.max_calls == 1
+    engine.start_watch(debounce_ms=50)
+    await asyncio.sleep(0.1)
 
     config_path.write_text(
         """rate_limits:\n  default:\n    max_calls: 5\n    window_seconds: 120\n"""
     )
 
-    await engine.reload()
+    for _ in range(100):
+        if engine.config.default_rate_limit.max_calls == 5:
+            break
+        await asyncio.sleep(0.05)
+    await engine.stop_watch()
     assert engine.config.default_rate_limit.max_calls == 5
     assert engine.config.default_rate_limit.window_seconds == 120
@@ -43,6 +43,9 @@ class _Web3Adapter:
     async def ensure_connection(self):
         return True
 
+    async def chain_id(self):
+        return self.w3.eth.chain_id
+
     async def get_nonce(self, *_):
         return 0
 
@@ -96,6 +99,9 @@ async def test_send_when_gas_below_simulate(tmp_path):
         async def ensure_connection(self):
             return True
 
+        async def chain_id(self):
+            return self.w3.eth.chain_id
+
         async def get_nonce(self, *_):
             return 0
 
@@ -183,8 +189,3 @@ async def test_micro_tip_helpers_dry_run(tmp_path):
         mgr, "mt", {"0x" + "1" * 40: 0.005, "0x" + "2" * 40: 0.005}, dry_run=True
     )
     assert res["action"] == "simulation"
-import os
-import sys
-
-# Allow running directly via `python test_strategies.py` without installing pkg
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
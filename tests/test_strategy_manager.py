@@ -38,6 +38,9 @@ class _Web3Adapter:
     async def ensure_connection(self):
         return True
 
+    async def chain_id(self):
+        return self.w3.eth.chain_id
+
     async def get_nonce(self, *_):
         return 0
 
@@ -147,8 +150,3 @@ async def test_list_and_delete_strategies(tmp_path):
     assert res["deleted"] == "s1"
     all_strats = await sm.list_strategies()
     assert "s1" not in all_strats and "s2" in all_strats
-import os
-import sys
-
-# Allow running directly via `python test_strategy_manager.py`
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
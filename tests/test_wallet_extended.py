@@ -1,11 +1,64 @@
 
-from cryptography.fernet import Fernet
+import asyncio
+import shutil
 
+import pytest
+import pytest_asyncio
+from cryptography.fernet import Fernet, InvalidToken
+
+from agentvault_mcp import WalletError
 from agentvault_mcp.core import ContextManager
-from agentvault_mcp.wallet import AgentWalletManager
+from agentvault_mcp.crypto import KeyCipher
+from agentvault_mcp.db.cli import upgrade
+from agentvault_mcp.db.engine import get_sync_engine
+from agentvault_mcp.db.repositories import WalletRepository
+from agentvault_mcp.wallet import AgentWalletManager, WalletState, WalletStore
 
 
+IMPORTED_PRIV = "0xfb4222fce02fa5e3d33ec08294b5fbeee428028532133116ff1d84fe8be9719f"
+IMPORTED_ADDR = "0xC4504EE5091e093499a0586Ca7525A0F20520747"
 CONTRACT_ADDR = "0x2222222222222222222222222222222222222222"
+_CONTRACT_ADDR_LOWER = CONTRACT_ADDR.lower()
+_CONTRACT_CODE = b"\x60\x60"
+_NO_CODE = b""
+
+_TYPED_DATA = {
+    "types": {
+        "EIP712Domain": [
+            {"name": "name", "type": "string"},
+            {"name": "version", "type": "string"},
+            {"name": "chainId", "type": "uint256"},
+            {"name": "verifyingContract", "type": "address"},
+        ],
+        "Person": [
+            {"name": "name", "type": "string"},
+            {"name": "wallet", "type": "address"},
+        ],
+        "Mail": [
+            {"name": "from", "type": "Person"},
+            {"name": "to", "type": "Person"},
+            {"name": "contents", "type": "string"},
+        ],
+    },
+    "primaryType": "Mail",
+    "domain": {
+        "name": "Ether Mail",
+        "version": "1",
+        "chainId": 11155111,
+        "verifyingContract": "0xCcCCccccCCCCcCCCCCCcCcCccCcCCCcCcccccccC",
+    },
+    "message": {
+        "from": {
+            "name": "Alice",
+            "wallet": IMPORTED_ADDR,
+        },
+        "to": {
+            "name": "Bob",
+            "wallet": "0xbBbBBBBbbBBBbbbBbbBbbbbBBbBbbbbBbBbbBBbB",
+        },
+        "contents": "Hello, Bob!",
+    },
+}
 
 
 class _Web3AdapterStub:
@@ -13,8 +66,6 @@ class _Web3AdapterStub:
         class eth:
             chain_id = 11155111
 
-            chain_id = 11155111
-
             @staticmethod
             async def get_block(identifier):
                 return {
@@ -23,6 +74,12 @@ class _Web3AdapterStub:
                     "timestamp": 1700000000,
                 }
 
+            class account:
+                @staticmethod
+                def sign_transaction(txn, _key):
+                    raw = txn["nonce"].to_bytes(32, "big")
+                    return type("Signed", (), {"rawTransaction": raw})()
+
         client_version = "Stub/v1"
 
         def to_wei(self, v, unit):
@@ -38,6 +95,9 @@ class _Web3AdapterStub:
     async def ensure_connection(self):
         return True
 
+    async def chain_id(self):
+        return self.w3.eth.chain_id
+
     async def get_balance(self, address, *_):
         return 10**21
 
@@ -57,8 +117,11 @@ class _Web3AdapterStub:
     async def get_nonce(self, *_):
         return 0
 
-    async def send_raw_transaction(self, *_):
-        return b""
+    async def send_raw_transaction(self, raw):
+        return raw
+
+    async def send_raw_transactions(self, raws):
+        return list(raws)
 
     async def wait_for_receipt(self, *_ , timeout=120):
         return type("R", (), {"status": 1})()
@@ -73,12 +136,10 @@ class _Web3AdapterStub:
         return True
 
     async def get_code(self, address):
-        if address.lower() == CONTRACT_ADDR.lower():
-            return b"``"
-        return b""
+        return _CONTRACT_CODE if address.lower() == _CONTRACT_ADDR_LOWER else _NO_CODE
 
     async def call_contract_function(self, address, abi, method, *args):
-        if address.lower() != CONTRACT_ADDR.lower():
+        if address.lower() != _CONTRACT_ADDR_LOWER:
             raise RuntimeError("no contract")
         data = {"symbol": "TOK", "name": "Token", "decimals": 18}
         if method not in data:
@@ -86,122 +147,246 @@ class _Web3AdapterStub:
         return data[method]
 
 
-def _make_manager(tmp_path):
+def _make_manager(tmp_path, migrated_db, web3_stub):
+    # Each test gets its own copy of the migrated schema; running Alembic per
+    # test dominated the runtime of this module.
+    db_path = tmp_path / "vaultpilot.db"
+    shutil.copyfile(migrated_db, db_path)
     ctx = ContextManager()
     key = Fernet.generate_key().decode()
-    db_url = f"sqlite+aiosqlite:///{tmp_path / 'vaultpilot.db'}"
     return AgentWalletManager(
         ctx,
-        _Web3AdapterStub(),
+        web3_stub,
         key,
-        database_url=db_url,
+        database_url=f"sqlite+aiosqlite:///{db_path}",
+        auto_migrate=False,
     )
 
 
-import pytest
+@pytest.fixture(scope="module")
+def web3_stub(stub_batch_transfer_context):
+    """The stub holds no per-test state, so every manager shares one instance."""
+
+    class _Stub(_Web3AdapterStub):
+        batch_transfer_context = stub_batch_transfer_context
+
+    return _Stub()
+
+
+@pytest.fixture(scope="session")
+def migrated_db(tmp_path_factory):
+    """Migrate one template database per session for ``_make_manager`` to copy."""
+    path = tmp_path_factory.mktemp("schema") / "template.db"
+    url = f"sqlite+aiosqlite:///{path}"
+    upgrade(url)
+    # Closing the last connection checkpoints the WAL into the main file.
+    get_sync_engine(url).dispose()
+    return path
 
 
-@pytest.mark.asyncio
-async def test_import_private_key_and_sign(tmp_path):
-    mgr = _make_manager(tmp_path)
-    priv = "0xfb4222fce02fa5e3d33ec08294b5fbeee428028532133116ff1d84fe8be9719f"
-    address = await mgr.import_wallet_from_private_key("imported", priv)
-    assert address == "0xC4504EE5091e093499a0586Ca7525A0F20520747"
+@pytest_asyncio.fixture(scope="module")
+async def imported_mgr(tmp_path_factory, migrated_db, web3_stub):
+    """One manager holding the ``imported`` wallet, shared by read-only tests."""
+    mgr = _make_manager(tmp_path_factory.mktemp("imported"), migrated_db, web3_stub)
+    await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    return mgr
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_import_private_key_and_sign(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    address = await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    assert address == IMPORTED_ADDR
 
     sign = await mgr.sign_message("imported", "hello")
     verify = await mgr.verify_message(address, "hello", sign["signature"])
     assert verify["valid"]
+    assert mgr._account_cache["imported"][0].address == address
 
+    await mgr.import_wallet_from_private_key("imported", "0x" + "11" * 32)
+    assert "imported" not in mgr._account_cache
 
-@pytest.mark.asyncio
-async def test_encrypt_and_decrypt_keystore(tmp_path):
-    mgr = _make_manager(tmp_path)
-    priv = "0xfb4222fce02fa5e3d33ec08294b5fbeee428028532133116ff1d84fe8be9719f"
-    await mgr.import_wallet_from_private_key("imported", priv)
-    encrypted = await mgr.encrypt_wallet_json("imported", "pass123")
-    data = await mgr.decrypt_wallet_json(encrypted, "pass123")
-    assert data["address"].lower() == "0xc4504ee5091e093499a0586ca7525a0f20520747".lower()
-    assert data["private_key"].lower() == priv.lower()
-
-
-@pytest.mark.asyncio
-async def test_sign_typed_data(tmp_path):
-    mgr = _make_manager(tmp_path)
-    priv = "0xfb4222fce02fa5e3d33ec08294b5fbeee428028532133116ff1d84fe8be9719f"
-    address = await mgr.import_wallet_from_private_key("imported", priv)
-
-    typed_data = {
-        "types": {
-            "EIP712Domain": [
-                {"name": "name", "type": "string"},
-                {"name": "version", "type": "string"},
-                {"name": "chainId", "type": "uint256"},
-                {"name": "verifyingContract", "type": "address"},
-            ],
-            "Person": [
-                {"name": "name", "type": "string"},
-                {"name": "wallet", "type": "address"},
-            ],
-            "Mail": [
-                {"name": "from", "type": "Person"},
-                {"name": "to", "type": "Person"},
-                {"name": "contents", "type": "string"},
-            ],
-        },
-        "primaryType": "Mail",
-        "domain": {
-            "name": "Ether Mail",
-            "version": "1",
-            "chainId": 11155111,
-            "verifyingContract": "0xCcCCccccCCCCcCCCCCCcCcCccCcCCCcCcccccccC",
-        },
-        "message": {
-            "from": {
-                "name": "Alice",
-                "wallet": address,
-            },
-            "to": {
-                "name": "Bob",
-                "wallet": "0xbBbBBBBbbBBBbbbBbbBbbbbBBbBbbbbBbBbbBBbB",
-            },
-            "contents": "Hello, Bob!",
-        },
-    }
 
-    signed = await mgr.sign_typed_data("imported", typed_data)
-    result = await mgr.verify_typed_data(address, typed_data, signed["signature"])
+@pytest.mark.asyncio(scope="module")
+async def test_encrypt_and_decrypt_keystore(imported_mgr):
+    # Minimal scrypt work factor: the default N=2**18 takes about a second.
+    encrypted = await imported_mgr.encrypt_wallet_json("imported", "pass123", iterations=2)
+    data = await imported_mgr.decrypt_wallet_json(encrypted, "pass123")
+    assert data["address"].lower() == IMPORTED_ADDR.lower()
+    assert data["private_key"].lower() == IMPORTED_PRIV.lower()
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_sign_typed_data(imported_mgr):
+    signed = await imported_mgr.sign_typed_data("imported", _TYPED_DATA)
+    result = await imported_mgr.verify_typed_data(IMPORTED_ADDR, _TYPED_DATA, signed["signature"])
     assert result["valid"]
 
 
-@pytest.mark.asyncio
-async def test_generate_mnemonic(tmp_path):
-    mgr = _make_manager(tmp_path)
+@pytest.mark.asyncio(scope="module")
+async def test_generate_mnemonic(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
     phrase = await mgr.generate_mnemonic()
     assert isinstance(phrase, str)
     assert len(phrase.split()) == 12
 
 
-@pytest.mark.asyncio
-async def test_provider_status(tmp_path):
-    mgr = _make_manager(tmp_path)
+@pytest.mark.asyncio(scope="module")
+async def test_provider_status(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
     info = await mgr.provider_status()
     assert info["chain_id"] == 11155111
     assert info["latest_block_number"] == 321
     assert info["rpc_url"] == "http://stub"
 
 
-@pytest.mark.asyncio
-async def test_inspect_contract(tmp_path):
-    mgr = _make_manager(tmp_path)
+@pytest.mark.asyncio(scope="module")
+async def test_inspect_contract(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
     data = await mgr.inspect_contract(CONTRACT_ADDR)
     assert data["is_contract"] is True
     assert data["bytecode_length"] > 0
     assert data["erc20_metadata"]["symbol"] == "TOK"
 
 
-@pytest.mark.asyncio
-async def test_inspect_contract_for_eoa(tmp_path):
-    mgr = _make_manager(tmp_path)
+@pytest.mark.asyncio(scope="module")
+async def test_inspect_contract_for_eoa(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
     data = await mgr.inspect_contract("0x1111111111111111111111111111111111111111")
     assert data["is_contract"] is False
     assert data["bytecode_length"] == 0
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_preload_wallets_hydrates_cache(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    address = await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    mgr.wallets.clear()
+    loaded = await mgr.preload_wallets()
+    assert loaded["imported"].address == address
+    assert mgr.wallets["imported"].address == address
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_simulate_transfer_rejects_malformed_address(imported_mgr):
+    with pytest.raises(WalletError):
+        await imported_mgr.simulate_transfer("imported", "0x1234", 0.01)
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_simulate_transfer_rejects_sub_wei_amount(imported_mgr):
+    with pytest.raises(WalletError, match="below 1 wei"):
+        await imported_mgr.simulate_transfer("imported", "0x" + "1" * 40, 1e-19)
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_execute_transfer_batch_assigns_sequential_nonces(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    hashes = await mgr.execute_transfer_batch(
+        "imported",
+        [("0x" + "1" * 40, 0.001), ("0x" + "2" * 40, 0.002)],
+    )
+    assert [int(h, 16) for h in hashes] == [0, 1]
+    assert mgr.wallets["imported"].last_nonce == 2
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_unconfirmed_transfers_get_consecutive_nonces(tmp_path, migrated_db, web3_stub):
+    # The stub node always reports nonce 0, as if nothing sent had been seen yet.
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    first = await mgr.execute_transfer("imported", "0x" + "1" * 40, 0.001, await_receipt=False)
+    second = await mgr.execute_transfer("imported", "0x" + "2" * 40, 0.001, await_receipt=False)
+    assert [int(first, 16), int(second, 16)] == [0, 1]
+    batch = await mgr.execute_transfer_batch(
+        "imported",
+        [("0x" + "1" * 40, 0.001), ("0x" + "2" * 40, 0.002)],
+        await_receipt=False,
+    )
+    assert [int(h, 16) for h in batch] == [2, 3]
+
+
+def test_wallet_store_upserts_rows_in_place():
+    store = WalletStore()
+    store.put("a", WalletState("w1", "0x" + "1" * 40, b"k1", 1))
+    store.put("b", WalletState("w2", "0x" + "2" * 40, b"k2", 1, last_nonce=4))
+    store.put("a", WalletState("w1", "0x" + "3" * 40, b"k3", 5))
+    store.set_last_nonce("b", 7)
+    assert len(store) == 2
+    assert store.addresses == ["0x" + "3" * 40, "0x" + "2" * 40]
+    assert store.has_address("0x" + "3" * 40) and not store.has_address("0x" + "1" * 40)
+    assert store["a"].last_nonce is None and store["a"].chain_id == 5
+    assert store["b"].last_nonce == 7
+    assert list(store.sorted_addresses()) == ["a", "b"]
+    store.put("0", WalletState("w3", "0x" + "4" * 40, b"k4", 1))
+    assert list(store.sorted_addresses()) == ["0", "a", "b"]
+
+
+def test_key_cipher_binds_agent_and_reads_legacy_fernet():
+    key = Fernet.generate_key()
+    cipher = KeyCipher(key)
+    blob = cipher.encrypt(b"k" * 32, "agent-a")
+    assert cipher.decrypt(blob, "agent-a") == b"k" * 32
+    with pytest.raises(InvalidToken):
+        cipher.decrypt(blob, "agent-b")
+    assert cipher.decrypt(Fernet(key).encrypt(b"legacy"), "agent-a") == b"legacy"
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_execute_transfer_settles_receipt_in_background(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    tx = await mgr.execute_transfer("imported", "0x" + "1" * 40, 0.001, await_receipt=False)
+    await asyncio.gather(*mgr._settle_tasks)
+    assert mgr.context.schema.state["receipts"]["imported"] == {tx: "success"}
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_background_batch_records_every_receipt(tmp_path, migrated_db, web3_stub, monkeypatch):
+    async def wait_for_receipt(tx_hash, timeout=120):
+        # The stub's hashes encode the nonce: fail the second transfer.
+        return type("R", (), {"status": 0 if int.from_bytes(tx_hash, "big") else 1})()
+
+    monkeypatch.setattr(web3_stub, "wait_for_receipt", wait_for_receipt)
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    hashes = await mgr.execute_transfer_batch(
+        "imported",
+        [("0x" + "1" * 40, 0.001), ("0x" + "2" * 40, 0.002)],
+        await_receipt=False,
+    )
+    await asyncio.gather(*mgr._settle_tasks)
+    assert mgr.context.schema.state["receipts"]["imported"] == {
+        hashes[0]: "success",
+        hashes[1]: "failed",
+    }
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_legacy_fernet_key_is_resealed_on_first_use(tmp_path, migrated_db, web3_stub):
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    legacy = mgr.encryptor._fernet.encrypt(bytes.fromhex(IMPORTED_PRIV[2:]))
+    async with mgr.session_maker() as session:
+        async with session.begin():
+            repo = WalletRepository(session, mgr.tenant_id)
+            await repo.update_encrypted_privkey("imported", legacy)
+    mgr.wallets.clear()
+    mgr._account_cache.clear()
+
+    await mgr.sign_message("imported", "hello")
+    async with mgr.session_maker() as session:
+        record = await WalletRepository(session, mgr.tenant_id).get_by_agent_id("imported")
+    assert KeyCipher.is_current(record.encrypted_privkey)
+    assert mgr.wallets["imported"].encrypted_privkey == record.encrypted_privkey
+
+
+@pytest.mark.asyncio(scope="module")
+async def test_query_balances_fetches_all_and_marks_failures(tmp_path, migrated_db, web3_stub):
+    # Writes balances into the context, so it gets its own manager, not imported_mgr.
+    mgr = _make_manager(tmp_path, migrated_db, web3_stub)
+    await mgr.import_wallet_from_private_key("imported", IMPORTED_PRIV)
+    balances = await mgr.query_balances(["imported", "missing"])
+    assert balances == {"imported": 1000.0, "missing": None}
+    assert mgr.context.schema.state["balances"]["imported"] == 1000.0
@@ -0,0 +1,230 @@
+import asyncio
+
+import aiohttp
+import pytest
+from web3.exceptions import TransactionNotFound, Web3RPCError
+
+from agentvault_mcp.adapters.web3_adapter import Web3Adapter, _float_to_wei
+
+_SENDER = "0x" + "a" * 40
+_RECIPIENT = "0x" + "b" * 40
+
+# Raw JSON-RPC results keyed by the eth method that requests them
+_RESULTS = {
+    "get_transaction_count": 7,
+    "priority_fee_per_gas": "0x3b9aca00",
+    "get_block": {"number": 321, "baseFeePerGas": 10},
+    "get_balance": 10**18,
+    "estimate_gas": 30_000,
+    "get_code": b"",
+}
+
+
+class _FakeProvider:
+    """Batching provider that answers from ``_RESULTS`` and records each batch."""
+
+    def __init__(self, *, transport_failures=0, rpc_error=None):
+        self.batches = []
+        self.transport_failures = transport_failures
+        self.rpc_error = rpc_error
+        # Raw JSON-RPC response entries, for calls sent straight to the provider
+        self.responses = None
+
+    async def make_request(self, method, params):
+        raise AssertionError(f"unexpected single request {method}")
+
+    async def make_batch_request(self, calls):
+        self.batches.append([name for name, _ in calls])
+        if self.transport_failures:
+            self.transport_failures -= 1
+            raise aiohttp.ClientConnectionError("connection reset")
+        if self.rpc_error is not None:
+            raise self.rpc_error
+        if self.responses is not None:
+            return self.responses
+        return [_RESULTS[name] for name, _ in calls]
+
+
+class _FakeBatch:
+    def __init__(self, provider):
+        self._provider = provider
+        self._calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def add(self, call):
+        self._calls.append(call)
+
+    async def async_execute(self):
+        return await self._provider.make_batch_request(self._calls)
+
+
+class _FakeEth:
+    def __getattr__(self, name):
+        return lambda *args: (name, args)
+
+
+class _FakeW3:
+    def __init__(self, provider):
+        self.provider = provider
+        self.eth = _FakeEth()
+
+    def batch_requests(self):
+        return _FakeBatch(self.provider)
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    for var in ("WEB3_RPC_URLS", "ALCHEMY_HTTP_URL", "ALCHEMY_WS_URL", "AGENTVAULT_WS_URL"):
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setenv("WEB3_RPC_URLS", "http://backup")
+    providers = {"http://primary": _FakeProvider(), "http://backup": _FakeProvider()}
+    monkeypatch.setattr(Web3Adapter, "_make_w3", lambda self, url: _FakeW3(providers[url]))
+    return providers
+
+
+@pytest.mark.asyncio
+async def test_batch_transfer_context_rotates_on_transport_error(providers):
+    providers["http://primary"].transport_failures = 1
+    adapter = Web3Adapter("http://primary")
+
+    nonce, fee, block, gas, balance = await adapter.batch_transfer_context(
+        _SENDER, {"to": _RECIPIENT, "value": 1}
+    )
+
+    assert (nonce, fee, gas, balance) == (7, 1_000_000_000, 30_000, 10**18)
+    assert block["number"] == 321
+    assert adapter.current_rpc_url == "http://backup"
+    assert len(providers["http://primary"].batches) == 1
+    assert len(providers["http://backup"].batches) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_transfer_context_propagates_rpc_errors(providers):
+    providers["http://primary"].rpc_error = Web3RPCError("execution reverted")
+    adapter = Web3Adapter("http://primary")
+
+    with pytest.raises(Web3RPCError):
+        await adapter.batch_transfer_context(_SENDER, {"to": _RECIPIENT, "data": "0x01"})
+
+    assert adapter.current_rpc_url == "http://primary"
+    assert providers["http://backup"].batches == []
+
+
+def test_eoa_cache_evicts_least_recently_used_and_expired(providers):
+    adapter = Web3Adapter("http://primary")
+    adapter._eoa_max = 2
+    a, b, c = ("0x" + ch * 40 for ch in "123")
+
+    adapter._remember_code(a, b"")
+    adapter._remember_code(b, b"")
+    assert adapter._known_eoa({"to": a})  # a becomes most recently used
+    adapter._remember_code(c, b"")
+    assert list(adapter._eoa_seen) == [a, c]
+
+    adapter._eoa_seen[a] -= adapter._eoa_ttl
+    adapter._remember_code(b, b"\x60")  # contract code is never cached
+    assert not adapter._known_eoa({"to": a})
+    assert list(adapter._eoa_seen) == [c]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("known_eoa", [False, True])
+@pytest.mark.parametrize("cached_fee", [False, True])
+async def test_batch_transfer_context_requests_only_what_is_not_cached(
+    providers, known_eoa, cached_fee
+):
+    adapter = Web3Adapter("http://primary")
+    if known_eoa:
+        adapter._remember_code(_RECIPIENT, b"")
+    if cached_fee:
+        adapter._remember_priority_fee(5)
+
+    nonce, fee, block, gas, balance = await adapter.batch_transfer_context(
+        _SENDER, {"to": _RECIPIENT, "value": 1}
+    )
+
+    expected = ["get_transaction_count"]
+    expected += [] if cached_fee else ["priority_fee_per_gas"]
+    expected += ["get_block", "get_balance"]
+    expected += [] if known_eoa else ["estimate_gas", "get_code"]
+    assert providers["http://primary"].batches == [expected]
+    assert (nonce, block["number"], balance) == (7, 321, 10**18)
+    assert fee == (5 if cached_fee else 1_000_000_000)
+    assert gas == (21_000 if known_eoa else 30_000)
+    # The code lookup marks the recipient, so the next transfer skips the estimate.
+    assert adapter._known_eoa({"to": _RECIPIENT})
+    assert adapter._cached_priority_fee() == fee
+
+
+@pytest.mark.asyncio
+async def test_send_raw_transactions_reports_partial_rejection(providers):
+    provider = providers["http://primary"]
+    provider.responses = [
+        {"jsonrpc": "2.0", "id": 0, "result": "0x" + "11" * 32},
+        {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "nonce too low"}},
+    ]
+    adapter = Web3Adapter("http://primary")
+
+    with pytest.raises(Web3RPCError, match="1 of 2 transactions rejected.*#2: nonce too low"):
+        await adapter.send_raw_transactions([b"\x01", b"\x02"])
+
+    # Never re-broadcast: one batch, no rotation.
+    assert provider.batches == [["eth_sendRawTransaction", "eth_sendRawTransaction"]]
+    assert providers["http://backup"].batches == []
+
+
+@pytest.mark.parametrize(
+    "value, factor, expected",
+    [
+        (0.1, 10**18, 10**17),
+        (1.5, 10**9, 1_500_000_000),
+        (-0.25, 10**18, -(25 * 10**16)),
+        (1e-05, 10**18, 10**13),
+        (123.000000000000000001, 10**18, 123 * 10**18),
+        (2.0, 1, 2),
+    ],
+)
+def test_float_to_wei_uses_the_shortest_decimal(value, factor, expected):
+    assert _float_to_wei(value, factor) == expected
+
+
+class _ReceiptEth:
+    """Chain whose receipt appears once the head moves past block 1."""
+
+    def __init__(self):
+        self.head = 1
+        self.lookups = 0
+
+    @property
+    def block_number(self):
+        async def _head():
+            return self.head
+
+        return _head()
+
+    async def get_transaction_receipt(self, tx_hash):
+        self.lookups += 1
+        if self.head < 2:
+            raise TransactionNotFound(f"{tx_hash} not found")
+        return {"status": 1}
+
+
+@pytest.mark.asyncio
+async def test_wait_for_receipt_rechecks_on_new_heads(providers):
+    adapter = Web3Adapter("http://primary")
+    adapter._head_poll_interval = 0.01
+    eth = adapter.w3.eth = _ReceiptEth()
+
+    waiter = asyncio.create_task(adapter.wait_for_receipt("0xabc", timeout=5))
+    await asyncio.sleep(0.05)
+    assert not waiter.done() and eth.lookups >= 1
+
+    eth.head = 2
+    assert await asyncio.wait_for(waiter, 1) == {"status": 1}
+    assert adapter._receipt_waiters == 0
+    await adapter.aclose()